@@ -0,0 +1,1056 @@
+import argparse
+import copy
+import io
+import json
+import collections
+import itertools
+import os
+import sys
+import threading
+import zipfile
+import zlib
+import numpy as np
+import pandas as pd
+import periodictable as pt
+
+COMPILED_FILE_NAME = 'compiled_database.bin'
+MANIFEST_FILE_NAME = 'manifest.json'
+
+_MAGIC = b'IMAGINGRESO\x00'
+_HEADER_SIZE_BYTES = 8
+_ALIGNMENT = 64
+
+CHUNK_ROWS = 8192  # number of rows per compressed chunk of the compiled database
+INDEX_STEP = 2048  # number of rows between two entries of the byte offsets index of the csv files
+
+# np.loadtxt is implemented in C since numpy 1.23, before that pandas is faster
+_NUMPY_C_LOADTXT = tuple(int(_v) for _v in np.__version__.split('.')[:2]) >= (1, 23)
+
+_compiled_databases = {}  # (file_name, mtime, inode, size) -> compiled database (see load_compiled_database)
+_manifests = {}  # database folder -> manifest
+_backends = {}  # database path -> backend
+_backend_ids = itertools.count()
+
+
+class LRUCache(object):
+    """least recently used cache of numpy arrays with a budget in bytes"""
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()  # key -> (value, nbytes)
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """return the value cached for key, or None"""
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, nbytes=0):
+        """add value to the cache and evict the least recently used entries to stay within max_bytes"""
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._nbytes > self.max_bytes:
+            _key, (_value, _nbytes) = self._entries.popitem(last=False)
+            self._nbytes -= _nbytes
+
+    def set_max_bytes(self, max_bytes=0):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def info(self):
+        with self._lock:
+            return {'hits': self._hits,
+                    'misses': self._misses,
+                    'entries': len(self._entries),
+                    'nbytes': self._nbytes,
+                    'max_bytes': self.max_bytes,
+                    }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._hits = 0
+            self._misses = 0
+
+
+# raw tables of the isotope files read by the backends, keyed by (backend key, file name, version)
+table_cache = LRUCache(max_bytes=512 * 1024 ** 2)
+
+
+def get_database_folder(database='ENDF_VIII'):
+    """return the full path of the folder of the database
+
+    Parameters:
+    ===========
+    database: string (default is 'ENDF_VIII'). Name of the database (folder in reference_data),
+      full path of a folder containing the isotope csv files or full path of a compiled database
+      (see compile_database)
+
+    Returns:
+    ========
+    full path of the database folder (or compiled file)
+    """
+    _file_path = os.path.abspath(os.path.dirname(__file__))
+    return os.path.join(_file_path, 'reference_data', database)
+
+
+def read_isotope_csv(file_name='', out=None):
+    """read the energy (eV) and sigma (barn) columns of an isotope csv file
+
+    The files have a fixed layout: a first line with the isotope (ex: 'Ag,107'), a second line with the
+    names of the columns ('E_eV,Sig_b'), then two columns of floats. The numbers are parsed straight
+    into a (2, nbr_rows) array, without the type inference of pandas.read_csv.
+
+    Parameters:
+    ===========
+    file_name: string. Full path of the csv file
+    out: np.array of shape (2, nbr_rows) (default is None). If provided, the data are written into it
+      (ex: a slice of a larger buffer pre-sized with the row counts of the manifest)
+
+    Returns:
+    ========
+    np.array of shape (2, nbr_rows), row 0 is the energy and row 1 the sigma
+
+    Raises:
+    =======
+    IOError if file does not exist
+    ValueError if out does not have the size of the file
+    """
+    if not os.path.exists(file_name):
+        raise IOError("File {} does not exist!".format(file_name))
+
+    _columns = _parse_csv_columns(source=file_name, skiprows=2)
+
+    if out is None:
+        out = np.empty((2, len(_columns)), dtype=np.float64)
+    elif out.shape != (2, len(_columns)):
+        raise ValueError("File {} has {} rows, buffer has shape {}!".format(file_name, len(_columns), out.shape))
+    out[0] = _columns[:, 0]
+    out[1] = _columns[:, 1]
+    return out
+
+
+def _parse_csv_columns(source='', skiprows=0):
+    """(nbr_rows, 2) float64 array of the energy and sigma columns of a csv file name or file object,
+    parsed with the fastest reader available (np.loadtxt or pandas)"""
+    if _NUMPY_C_LOADTXT:
+        return np.loadtxt(source, delimiter=',', skiprows=skiprows, dtype=np.float64, ndmin=2)
+    return pd.read_csv(source, skiprows=skiprows, header=None, dtype=np.float64, engine='c',
+                       na_filter=False).values
+
+
+def _read_first_line(file_name=''):
+    with open(file_name, 'r') as _f:
+        return _f.readline().strip()
+
+
+def compile_database(database='ENDF_VIII', file_name='', dtype='float64', compress=False, duplicates='keep'):
+    """compile all the csv files of a database folder into a single binary file that can be memory-mapped
+
+    The file starts with a small json header (offset table of each isotope and manifest of the database,
+    see build_manifest) followed by the energy (eV)
+    of all the isotopes concatenated as a contiguous float64 array, then the sigma (barn) as a contiguous
+    array of the requested dtype. The energy is always kept in float64 so that it stays strictly increasing.
+
+    With compress=True, each isotope is split in chunks of CHUNK_ROWS rows compressed with zlib. The file
+    is smaller but can not be memory-mapped: only the chunks covering the requested energy range are
+    read and decompressed.
+
+    The compiled file is a self-contained archive: it can be used next to the csv files (read instead of
+    them) or on its own as the database of a Resonance object. As it is read instead of the csv files, the
+    COMPILED_FILE_NAME file of the database folder must give the same values: it is always float64 with all
+    the rows of the csv files.
+
+    Parameters:
+    ===========
+    database: string (default is 'ENDF_VIII'). Name or full path of the database folder
+    file_name: string (default is ''). Output file. If empty, COMPILED_FILE_NAME inside the database folder
+    dtype: string (default is 'float64'). Type of the sigma, 'float64' or 'float32' (not for the
+      COMPILED_FILE_NAME file of the database folder)
+    compress: boolean (default is False). If True, compress chunks of the arrays with zlib
+    duplicates: string (default is 'keep'). What to do with rows having the same energy as the previous one
+      'keep': store them as they are in the csv files
+      'drop': keep only the first row of each energy (not for the COMPILED_FILE_NAME file of the database folder)
+      'error': raise ValueError
+
+    Returns:
+    ========
+    full path of the compiled file
+
+    Raises:
+    =======
+    ValueError if database can not be found
+    ValueError if dtype or duplicates is not supported
+    ValueError if dtype is 'float32' or duplicates is 'drop' for the COMPILED_FILE_NAME file of the database folder
+    ValueError if the energies of a file are not sorted
+    ValueError if a file has duplicate energies and duplicates is 'error'
+    """
+    _database_folder = get_database_folder(database=database)
+    if not os.path.exists(_database_folder):
+        raise ValueError("Database {} does not exist!".format(database))
+
+    _sigma_dtype = np.dtype(dtype)
+    if _sigma_dtype not in (np.dtype('float64'), np.dtype('float32')):
+        raise ValueError("dtype {} not supported ['float64', 'float32']!".format(dtype))
+
+    if duplicates not in ('keep', 'drop', 'error'):
+        raise ValueError("duplicates {} not supported ['keep', 'drop', 'error']!".format(duplicates))
+
+    if file_name == '':
+        file_name = os.path.join(_database_folder, COMPILED_FILE_NAME)
+
+    # the compiled file of the folder is read instead of the csv files, it can not lose any value
+    if os.path.abspath(file_name) == os.path.abspath(os.path.join(_database_folder, COMPILED_FILE_NAME)) and \
+            (_sigma_dtype != np.dtype('float64') or duplicates == 'drop'):
+        raise ValueError("{} is read instead of the csv files, it must be float64 without dropping duplicates! "
+                         "Use another output file.".format(file_name))
+
+    # pre-size the buffer with the row counts of the manifest
+    _manifest = get_manifest(database=database)
+    _isotopes = {}
+    _offset = 0
+    for _element in sorted(_manifest['elements']):
+        _file_rows = zip(_manifest['elements'][_element]['file_names'], _manifest['elements'][_element]['rows'])
+        for _file, _nbr_rows in _file_rows:
+            _isotopes[_file] = {'offset': _offset,
+                                'rows': _nbr_rows,
+                                'header': _read_first_line(os.path.join(_database_folder, _file))}
+            _offset += _nbr_rows
+
+    _data = np.empty((2, _offset), dtype=np.float64)
+    for _file, _isotope in _isotopes.items():
+        _start = _isotope['offset']
+        read_isotope_csv(file_name=os.path.join(_database_folder, _file),
+                         out=_data[:, _start:_start + _isotope['rows']])
+
+    _rows_to_keep = np.ones(_offset, dtype=bool)
+    for _file, _isotope in _isotopes.items():
+        _start = _isotope['offset']
+        _steps = np.diff(_data[0, _start:_start + _isotope['rows']])
+        if (_steps < 0).any():
+            raise ValueError("Energies of file {} are not sorted!".format(_file))
+        _nbr_duplicates = int((_steps == 0).sum())
+        if _nbr_duplicates and duplicates == 'error':
+            raise ValueError("File {} has {} duplicate energies!".format(_file, _nbr_duplicates))
+        if _nbr_duplicates and duplicates == 'drop':
+            _rows_to_keep[_start + 1:_start + _isotope['rows']] = _steps != 0
+
+    if not _rows_to_keep.all():
+        _new_offset = np.concatenate([[0], np.cumsum(_rows_to_keep)])
+        for _isotope in _isotopes.values():
+            _start = _isotope['offset']
+            _isotope['offset'] = int(_new_offset[_start])
+            _isotope['rows'] = int(_new_offset[_start + _isotope['rows']] - _new_offset[_start])
+        _data = _data[:, _rows_to_keep]
+        _offset = _data.shape[1]
+
+    _energy = _data[0]
+    _sigma = _data[1].astype(_sigma_dtype)
+
+    # the manifest travels with the data, without the byte offsets index of the csv files
+    _archive_manifest = copy.deepcopy(_manifest)
+    for _element in _archive_manifest['elements'].values():
+        _element.pop('index', None)
+        _element['rows'] = [_isotopes[_file]['rows'] for _file in _element['file_names']]
+
+    _header = {'energy_dtype': 'float64',
+               'sigma_dtype': _sigma_dtype.name,
+               'nbr_rows': _offset,
+               'compression': 'zlib' if compress else None,
+               'duplicates': duplicates,
+               'isotopes': _isotopes,
+               'manifest': _archive_manifest,
+               }
+
+    _blocks = []
+    if compress:
+        _position = 0
+        for _isotope in _isotopes.values():
+            _isotope['chunks'] = []
+            _start = _isotope['offset']
+            for _chunk_start in range(_start, _start + _isotope['rows'], CHUNK_ROWS):
+                _chunk_end = min(_chunk_start + CHUNK_ROWS, _start + _isotope['rows'])
+                _chunk = {'energy': float(_energy[_chunk_start])}
+                for _key, _array in [('energy_bytes', _energy), ('sigma_bytes', _sigma)]:
+                    _block = zlib.compress(_array[_chunk_start:_chunk_end].tobytes())
+                    _chunk[_key] = [_position, len(_block)]
+                    _blocks.append(_block)
+                    _position += len(_block)
+                _isotope['chunks'].append(_chunk)
+    else:
+        _energy_block = _energy.tobytes()
+        _padding = b'\x00' * ((-len(_energy_block)) % _ALIGNMENT)
+        _header['sigma_offset'] = len(_energy_block) + len(_padding)
+        _blocks = [_energy_block, _padding, _sigma.tobytes()]
+
+    _write_compiled_file(file_name=file_name, header=_header, blocks=_blocks)
+
+    return file_name
+
+
+def _write_compiled_file(file_name='', header={}, blocks=[]):
+    """write the magic string, the size of the json header, the header and the data blocks (aligned)"""
+    _header = json.dumps(header).encode('utf8')
+    _data_offset = len(_MAGIC) + _HEADER_SIZE_BYTES + len(_header)
+    _padding = (-_data_offset) % _ALIGNMENT
+    _header += b' ' * _padding
+
+    _tmp_file_name = file_name + '.tmp'
+    with open(_tmp_file_name, 'wb') as _f:
+        _f.write(_MAGIC)
+        _f.write(np.uint64(len(_header)).tobytes())
+        _f.write(_header)
+        for _block in blocks:
+            _f.write(_block)
+    os.replace(_tmp_file_name, file_name)
+
+
+def load_compiled_database(file_name=''):
+    """memory-map the compiled database file
+
+    The mapping is kept for the life of the process and reloaded only if the file changed.
+
+    Parameters:
+    ===========
+    file_name: string. Full path of the compiled file
+
+    Returns:
+    ========
+    {'file_name': string,
+     'header': dict,
+     'data_offset': int. Position of the first data block in the file
+     'energy': np.memmap of all the energies (None if compressed),
+     'sigma': np.memmap of all the sigma (None if compressed),
+     }
+
+    Raises:
+    =======
+    IOError if file does not exist
+    ValueError if file is not a compiled database
+    """
+    if not os.path.exists(file_name):
+        raise IOError("File {} does not exist!".format(file_name))
+
+    # a new compilation replaces the file (new inode)
+    _stat = os.stat(file_name)
+    _key = (os.path.abspath(file_name), _stat.st_mtime_ns, _stat.st_ino, _stat.st_size)
+    if _key in _compiled_databases:
+        return _compiled_databases[_key]
+
+    with open(file_name, 'rb') as _f:
+        if _f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError("File {} is not a compiled database!".format(file_name))
+        _header_size = int(np.frombuffer(_f.read(_HEADER_SIZE_BYTES), dtype=np.uint64)[0])
+        _header = json.loads(_f.read(_header_size).decode('utf8'))
+
+    _data_offset = len(_MAGIC) + _HEADER_SIZE_BYTES + _header_size
+    _nbr_rows = _header['nbr_rows']
+    _energy = None
+    _sigma = None
+    if _header['compression'] is None:
+        if _nbr_rows == 0:
+            _energy = np.empty(0, dtype=_header['energy_dtype'])
+            _sigma = np.empty(0, dtype=_header['sigma_dtype'])
+        else:
+            _energy = np.memmap(file_name, dtype=_header['energy_dtype'], mode='r',
+                                offset=_data_offset, shape=(_nbr_rows,))
+            _sigma = np.memmap(file_name, dtype=_header['sigma_dtype'], mode='r',
+                               offset=_data_offset + _header['sigma_offset'], shape=(_nbr_rows,))
+
+    # forget previous versions of this file
+    for _old_key in [_k for _k in _compiled_databases if _k[0] == _key[0]]:
+        del _compiled_databases[_old_key]
+
+    _compiled = {'file_name': _key[0],
+                 'header': _header,
+                 'data_offset': _data_offset,
+                 'energy': _energy,
+                 'sigma': _sigma,
+                 }
+    _compiled_databases[_key] = _compiled
+    return _compiled
+
+
+def _read_compressed_isotope(compiled={}, isotope={}, E_min=None, E_max=None):
+    """decompress the chunks of the isotope that cover [E_min, E_max]"""
+    _header = compiled['header']
+    _chunks = isotope['chunks']
+    _first_chunk, _last_chunk = get_window(energy=[_chunk['energy'] for _chunk in _chunks],
+                                           E_min=E_min, E_max=E_max)
+    _energy = []
+    _sigma = []
+    with open(compiled['file_name'], 'rb') as _f:
+        for _chunk in _chunks[_first_chunk:_last_chunk]:
+            for _key, _dtype, _list in [('energy_bytes', _header['energy_dtype'], _energy),
+                                        ('sigma_bytes', _header['sigma_dtype'], _sigma)]:
+                _position, _size = _chunk[_key]
+                _f.seek(compiled['data_offset'] + _position)
+                _list.append(np.frombuffer(zlib.decompress(_f.read(_size)), dtype=_dtype))
+    if not _energy:
+        return np.empty(0, dtype=_header['energy_dtype']), np.empty(0, dtype=_header['sigma_dtype'])
+    if len(_energy) == 1:
+        return _energy[0], _sigma[0]
+    _energy = np.concatenate(_energy)
+    _sigma = np.concatenate(_sigma)
+    _energy.flags.writeable = False
+    _sigma.flags.writeable = False
+    return _energy, _sigma
+
+
+def get_window(energy=[], E_min=None, E_max=None):
+    """return the rows [start, end) of the sorted energy array that bracket [E_min, E_max]
+
+    The first row is the last one <= E_min and the last row the first one > E_max, so that a linear
+    interpolation over the window gives the same result as over the entire array, even when E_min or E_max
+    is a repeated energy (np.interp uses the last row of a repeated energy).
+
+    Parameters:
+    ===========
+    energy: sorted np.array (or np.memmap, only log(n) values are read)
+    E_min: float (default is None). If None, start from the first row
+    E_max: float (default is None). If None, go up to the last row
+
+    Returns:
+    ========
+    (start, end)
+    """
+    _nbr_rows = len(energy)
+    _start = 0
+    _end = _nbr_rows
+    if E_min is not None:
+        _start = max(int(np.searchsorted(energy, E_min, side='right')) - 1, 0)
+    if E_max is not None:
+        _end = min(int(np.searchsorted(energy, E_max, side='right')) + 1, _nbr_rows)
+    return _start, _end
+
+
+def get_compiled_data(file_name='', E_min=None, E_max=None):
+    """return the energy (eV) and sigma (barn) arrays of the isotope csv file from the compiled database
+    sitting next to it
+
+    Parameters:
+    ===========
+    file_name: string. Full path of the isotope csv file (ex: '.../ENDF_VIII/Ag-107.csv'), or path of the
+      isotope inside a compiled database (ex: '.../ENDF_VIII.bin/Ag-107.csv')
+    E_min: float (default is None). If provided with E_max, only the rows bracketing [E_min, E_max] are returned
+    E_max: float (default is None)
+
+    Returns:
+    ========
+    {'E_eV': np.array, 'Sig_b': np.array} read-only views of the memory-mapped file (sigma has the dtype
+    used to compile the database)
+    or None if there is no up to date compiled database for this file
+    """
+    _parent = os.path.dirname(os.path.abspath(file_name))
+    if os.path.isfile(_parent):
+        # file_name is inside a compiled database used on its own (ex: '.../ENDF_VIII.bin/Ag-107.csv')
+        _compiled_file = _parent
+    else:
+        _compiled_file = os.path.join(_parent, COMPILED_FILE_NAME)
+        if not os.path.exists(_compiled_file):
+            return None
+        if os.path.exists(file_name) and os.path.getmtime(file_name) > os.path.getmtime(_compiled_file):
+            # csv file has been modified since compilation
+            return None
+        if not _is_lossless(header=load_compiled_database(file_name=_compiled_file)['header']):
+            # values differ from the csv files
+            return None
+
+    _compiled = load_compiled_database(file_name=_compiled_file)
+    return _read_compiled_isotope(compiled=_compiled, file_name=os.path.basename(file_name),
+                                  E_min=E_min, E_max=E_max)
+
+
+def _is_lossless(header={}):
+    """True if the compiled database has the values of the csv files (float64 sigma and all the rows)"""
+    return header['sigma_dtype'] == 'float64' and header.get('duplicates') in ('keep', 'error')
+
+
+def _read_compiled_isotope(compiled={}, file_name='', E_min=None, E_max=None):
+    """energy and sigma of the isotope file_name (ex: 'Ag-107.csv') from the compiled database,
+    or None if the isotope is not in it"""
+    _compiled = compiled
+    _isotope = _compiled['header']['isotopes'].get(file_name)
+    if _isotope is None:
+        return None
+
+    if _compiled['header']['compression'] is None:
+        _start = _isotope['offset']
+        _end = _start + _isotope['rows']
+        _energy = _compiled['energy'][_start:_end]
+        _sigma = _compiled['sigma'][_start:_end]
+    else:
+        _energy, _sigma = _read_compressed_isotope(compiled=_compiled, isotope=_isotope,
+                                                   E_min=E_min, E_max=E_max)
+
+    if E_min is not None or E_max is not None:
+        _start, _end = get_window(energy=_energy, E_min=E_min, E_max=E_max)
+        _energy = _energy[_start:_end]
+        _sigma = _sigma[_start:_end]
+    return {'E_eV': _energy,
+            'Sig_b': _sigma}
+
+
+def _split_file_name(file_name=''):
+    """'Ag-107.csv' -> ('Ag', 107)"""
+    [_name, _number] = os.path.splitext(os.path.basename(file_name))[0].split('-')
+    return _name, int(_number)
+
+
+def _build_index(file_name='', energy=[]):
+    """energy and byte offset of every INDEX_STEP-th row of the csv file"""
+    with open(file_name, 'rb') as _f:
+        _raw = _f.read()
+    _line_starts = np.flatnonzero(np.frombuffer(_raw, dtype=np.uint8) == ord('\n')) + 1
+    # skip the 2 header lines
+    _row_starts = _line_starts[1:1 + len(energy)]
+    return {'size': len(_raw),
+            'energy': [float(_e) for _e in energy[::INDEX_STEP]],
+            'offset': [int(_o) for _o in _row_starts[::INDEX_STEP]],
+            }
+
+
+def read_isotope_csv_window(file_name='', index={}, E_min=None, E_max=None):
+    """read only the rows of the csv file that bracket [E_min, E_max], using the byte offsets index
+    of the manifest to seek into the file
+
+    Parameters:
+    ===========
+    file_name: string. Full path of the csv file
+    index: dictionary. Byte offsets index of the file (see build_manifest)
+    E_min: float (default is None). If None, start from the first row
+    E_max: float (default is None). If None, go up to the last row
+
+    Returns:
+    ========
+    np.array of shape (2, nbr_rows), row 0 is the energy and row 1 the sigma
+    or None if the index does not match the file (file modified since the manifest was built)
+    """
+    if os.path.getsize(file_name) != index['size']:
+        return None
+
+    _index_energy = index['energy']
+    _index_offset = index['offset']
+    _first_block, _last_block = get_window(energy=_index_energy, E_min=E_min, E_max=E_max)
+    with open(file_name, 'rb') as _f:
+        _f.seek(_index_offset[_first_block])
+        if _last_block < len(_index_offset):
+            _raw = _f.read(_index_offset[_last_block] - _index_offset[_first_block])
+        else:
+            _raw = _f.read()
+
+    _columns = _parse_csv_columns(source=io.BytesIO(_raw))
+    _start, _end = get_window(energy=_columns[:, 0], E_min=E_min, E_max=E_max)
+    _data = np.empty((2, _end - _start), dtype=np.float64)
+    _data[0] = _columns[_start:_end, 0]
+    _data[1] = _columns[_start:_end, 1]
+    return _data
+
+
+def _add_isotope_to_manifest(elements={}, file_name='', energy=[]):
+    """add the isotope of file_name (ex: 'Ag-107.csv') to the elements of the manifest and return its element"""
+    _name, _number = _split_file_name(file_name)
+    _isotope = '{}-{}'.format(_number, _name)
+    if _name not in elements:
+        elements[_name] = {'isotopes': [],
+                           'file_names': [],
+                           'rows': [],
+                           'energy_min': [],
+                           'energy_max': [],
+                           'mass': [],
+                           'isotopic_ratio': [],
+                           'density': [],
+                           'index': [],
+                           'element_density': pt.elements.isotope(_name).density,
+                           'element_molar_mass': pt.elements.isotope(_name).mass,
+                           }
+    _element = elements[_name]
+    _element['isotopes'].append(_isotope)
+    _element['file_names'].append(file_name)
+    _element['rows'].append(len(energy))
+    _element['energy_min'].append(float(energy[0]))
+    _element['energy_max'].append(float(energy[-1]))
+    _element['mass'].append(pt.elements.isotope(_isotope).mass)
+    _element['isotopic_ratio'].append(pt.elements.isotope(_isotope).abundance / 100.)
+    _element['density'].append(pt.elements.isotope(_isotope).density)
+    return _element
+
+
+def _manifest_from_arrays(energies={}):
+    """manifest (without byte offsets index) of the isotopes {file_name: energy array}"""
+    _elements = {}
+    for _file in sorted(energies, key=_split_file_name):
+        _add_isotope_to_manifest(elements=_elements, file_name=_file, energy=energies[_file])
+    for _element in _elements.values():
+        del _element['index']
+    return {'elements': _elements}
+
+
+def build_manifest(database='ENDF_VIII', write=True):
+    """scan the database folder and build the manifest of its elements and isotopes
+
+    Parameters:
+    ===========
+    database: string (default is 'ENDF_VIII'). Name or full path of the database folder
+    write: boolean (default is True). If True, the manifest is saved as MANIFEST_FILE_NAME inside the folder
+
+    Returns:
+    ========
+    dictionary of the elements found
+      ex: {'elements': {'Ag': {'isotopes': ['107-Ag', '109-Ag'],
+                               'file_names': ['Ag-107.csv', 'Ag-109.csv'],
+                               'rows': [71500, 71500],
+                               'energy_min': [1e-05, 1e-05],
+                               'energy_max': [20000000.0, 20000000.0],
+                               'mass': [106.905093, 108.904756],
+                               'isotopic_ratio': [0.51839, 0.48161],
+                               'density': [10.406250514, 10.600899418],
+                               'index': [{'size': 2180616,
+                                          'energy': [1e-05, ...],
+                                          'offset': [17, ...]}, ...],
+                               'element_density': 10.5,
+                               'element_molar_mass': 107.8682,
+                               },
+                       },
+          }
+
+    Raises:
+    =======
+    ValueError if database can not be found
+    """
+    _database_folder = get_database_folder(database=database)
+    if not os.path.exists(_database_folder):
+        raise ValueError("Database {} does not exist!".format(database))
+
+    _list_files = [_file for _file in os.listdir(_database_folder) if _file.endswith('.csv')]
+    _list_files.sort(key=_split_file_name)
+
+    _elements = {}
+    for _file in _list_files:
+        _full_file_name = os.path.join(_database_folder, _file)
+        _data = read_isotope_csv(file_name=_full_file_name)
+        _element = _add_isotope_to_manifest(elements=_elements, file_name=_file, energy=_data[0])
+        _element['index'].append(_build_index(file_name=_full_file_name, energy=_data[0]))
+
+    _manifest = {'elements': _elements}
+    if write:
+        with open(os.path.join(_database_folder, MANIFEST_FILE_NAME), 'w') as _f:
+            json.dump(_manifest, _f, indent=1, sort_keys=True)
+    _manifests[_database_folder] = _manifest
+    return _manifest
+
+
+def get_manifest(database='ENDF_VIII'):
+    """return the manifest of the database (see build_manifest)
+
+    For a folder, the manifest is loaded once per process from MANIFEST_FILE_NAME. If this file is missing,
+    or does not list the same csv files as the folder, the manifest is built in memory.
+    For a compiled database, the manifest stored in the file is returned.
+
+    Parameters:
+    ===========
+    database: string (default is 'ENDF_VIII'). Name or full path of the database folder, full path
+      of a compiled database or zip archive, or DatabaseBackend object
+
+    Raises:
+    =======
+    ValueError if database can not be found
+    """
+    return get_backend(database=database).get_manifest()
+
+
+def _get_folder_manifest(database_folder=''):
+    """manifest of the csv files of the folder (see get_manifest)"""
+    if database_folder in _manifests:
+        return _manifests[database_folder]
+
+    _manifest_file = os.path.join(database_folder, MANIFEST_FILE_NAME)
+    if os.path.exists(_manifest_file):
+        with open(_manifest_file, 'r') as _f:
+            _manifest = json.load(_f)
+        _list_files = set([_file for _file in os.listdir(database_folder) if _file.endswith('.csv')])
+        _list_files_manifest = set()
+        for _element in _manifest['elements'].values():
+            _list_files_manifest.update(_element['file_names'])
+        if _list_files == _list_files_manifest:
+            _manifests[database_folder] = _manifest
+            return _manifest
+
+    return build_manifest(database=database_folder, write=False)
+
+
+def _window_table(table={}, E_min=None, E_max=None):
+    """rows of the table {'E_eV', 'Sig_b'} bracketing [E_min, E_max]"""
+    if E_min is None and E_max is None:
+        return table
+    _start, _end = get_window(energy=table['E_eV'], E_min=E_min, E_max=E_max)
+    return {'E_eV': table['E_eV'][_start:_end],
+            'Sig_b': table['Sig_b'][_start:_end]}
+
+
+def _read_only_table(data=[]):
+    """(2, nbr_rows) array -> read-only {'E_eV', 'Sig_b'}"""
+    data.flags.writeable = False
+    return {'E_eV': data[0],
+            'Sig_b': data[1]}
+
+
+class DatabaseBackend(object):
+    """storage of the cross-sections of a database
+
+    A backend lists the elements and isotopes of the database (manifest, see build_manifest) and returns
+    the energy (eV) and sigma (barn) arrays of an isotope, optionally only the rows bracketing an energy
+    range. Subclass it to plug another storage into Resonance(database=...).
+    """
+
+    def __init__(self):
+        # identifies the backend in the caches
+        self.key = (type(self).__name__, next(_backend_ids))
+
+    def get_manifest(self):
+        """return the manifest of the database (see build_manifest)"""
+        raise NotImplementedError
+
+    def list_elements(self):
+        """return the sorted list of the elements of the database"""
+        return sorted(self.get_manifest()['elements'])
+
+    def list_isotopes(self, element=''):
+        """return the list of the isotope file names of the element (ex: ['Ag-107.csv', 'Ag-109.csv'])"""
+        _elements = self.get_manifest()['elements']
+        if element not in _elements:
+            return []
+        return list(_elements[element]['file_names'])
+
+    def get_version(self, file_name=''):
+        """return a value that changes when the data of the isotope file_name change
+
+        Raises:
+        =======
+        IOError if file_name is not in the database
+        """
+        return 0
+
+    def get_data(self, file_name='', E_min=None, E_max=None):
+        """return the energy (eV) and sigma (barn) of the isotope
+
+        Parameters:
+        ===========
+        file_name: string. Name of the isotope file (ex: 'Ag-107.csv')
+        E_min: float (default is None). If provided, start from the last row <= E_min
+        E_max: float (default is None). If provided, stop at the first row >= E_max
+
+        Returns:
+        ========
+        {'E_eV': np.array, 'Sig_b': np.array} read-only arrays
+
+        Raises:
+        =======
+        IOError if file_name is not in the database
+        """
+        raise NotImplementedError
+
+
+class _CachedTablesBackend(DatabaseBackend):
+    """backend whose tables are parsed from files and kept in table_cache"""
+
+    def _read(self, file_name=''):
+        """(2, nbr_rows) array of the entire file"""
+        raise NotImplementedError
+
+    def _read_window(self, file_name='', E_min=None, E_max=None):
+        """(2, nbr_rows) array of the rows bracketing [E_min, E_max], or None if not supported"""
+        return None
+
+    def get_data(self, file_name='', E_min=None, E_max=None):
+        _key = (self.key, file_name, self.get_version(file_name=file_name))
+        _table = table_cache.get(_key)
+        if _table is None and (E_min is not None or E_max is not None):
+            # file not cached yet, read only the window if possible
+            _data = self._read_window(file_name=file_name, E_min=E_min, E_max=E_max)
+            if _data is not None:
+                return _read_only_table(data=_data)
+        if _table is None:
+            _data = self._read(file_name=file_name)
+            _table = _read_only_table(data=_data)
+            table_cache.put(_key, _table, nbytes=_data.nbytes)
+        return _window_table(table=_table, E_min=E_min, E_max=E_max)
+
+
+class CsvFolderBackend(_CachedTablesBackend):
+    """folder of isotope csv files (ex: reference_data/ENDF_VIII)
+
+    An up to date compiled database inside the folder (see compile_database) is read instead of the csv files.
+    """
+
+    def __init__(self, folder=''):
+        DatabaseBackend.__init__(self)
+        self.folder = os.path.abspath(folder)
+        self.key = ('csv', self.folder)
+
+    def get_manifest(self):
+        return _get_folder_manifest(database_folder=self.folder)
+
+    def get_version(self, file_name=''):
+        _file_name = os.path.join(self.folder, file_name)
+        _compiled_file = os.path.join(self.folder, COMPILED_FILE_NAME)
+        _mtime = os.path.getmtime(_file_name) if os.path.exists(_file_name) else None
+        _compiled_mtime = os.path.getmtime(_compiled_file) if os.path.exists(_compiled_file) else None
+        if _mtime is None and (_compiled_mtime is None or
+                               file_name not in load_compiled_database(_compiled_file)['header']['isotopes']):
+            raise IOError("File {} does not exist!".format(_file_name))
+        return _mtime, _compiled_mtime
+
+    def get_data(self, file_name='', E_min=None, E_max=None):
+        _compiled = get_compiled_data(file_name=os.path.join(self.folder, file_name), E_min=E_min, E_max=E_max)
+        if _compiled is not None:
+            return _compiled
+        return _CachedTablesBackend.get_data(self, file_name=file_name, E_min=E_min, E_max=E_max)
+
+    def _read(self, file_name=''):
+        return read_isotope_csv(file_name=os.path.join(self.folder, file_name))
+
+    def _read_window(self, file_name='', E_min=None, E_max=None):
+        _index = self._get_index(file_name=file_name)
+        if _index is None:
+            return None
+        return read_isotope_csv_window(file_name=os.path.join(self.folder, file_name), index=_index,
+                                       E_min=E_min, E_max=E_max)
+
+    def _get_index(self, file_name=''):
+        """byte offsets index of the file from the manifest, or None"""
+        if self.folder not in _manifests and not os.path.exists(os.path.join(self.folder, MANIFEST_FILE_NAME)):
+            # building the manifest would read all the files of the folder
+            return None
+        _elements = self.get_manifest()['elements']
+        try:
+            _name, _number = _split_file_name(file_name)
+        except ValueError:
+            return None
+        _element = _elements.get(_name)
+        if _element is None or file_name not in _element['file_names'] or 'index' not in _element:
+            return None
+        return _element['index'][_element['file_names'].index(file_name)]
+
+
+class CompiledBackend(DatabaseBackend):
+    """compiled database used on its own (see compile_database), read through np.memmap"""
+
+    def __init__(self, file_name=''):
+        DatabaseBackend.__init__(self)
+        self.file_name = os.path.abspath(file_name)
+        self.key = ('compiled', self.file_name)
+
+    def get_manifest(self):
+        return load_compiled_database(file_name=self.file_name)['header']['manifest']
+
+    def get_version(self, file_name=''):
+        return os.path.getmtime(self.file_name)
+
+    def get_data(self, file_name='', E_min=None, E_max=None):
+        _compiled = load_compiled_database(file_name=self.file_name)
+        _table = _read_compiled_isotope(compiled=_compiled, file_name=file_name, E_min=E_min, E_max=E_max)
+        if _table is None:
+            raise IOError("File {} does not exist in {}!".format(file_name, self.file_name))
+        return _table
+
+
+class ZipBackend(_CachedTablesBackend):
+    """zip archive of isotope csv files (ex: zipped export of a database folder)
+
+    The manifest is read from a MANIFEST_FILE_NAME member when it lists the same files, otherwise it is
+    built in memory (all the files are read once).
+    """
+
+    def __init__(self, file_name=''):
+        DatabaseBackend.__init__(self)
+        self.file_name = os.path.abspath(file_name)
+        self.key = ('zip', self.file_name)
+        self._manifest = None
+        self._manifest_version = None
+        with zipfile.ZipFile(self.file_name) as _zip:
+            self._members = dict([(os.path.basename(_name), _name) for _name in _zip.namelist()])
+
+    def _list_csv(self):
+        return set([_name for _name in self._members if _name.endswith('.csv')])
+
+    def get_manifest(self):
+        _version = os.path.getmtime(self.file_name)
+        if self._manifest is not None and self._manifest_version == _version:
+            return self._manifest
+
+        _manifest = None
+        if MANIFEST_FILE_NAME in self._members:
+            with zipfile.ZipFile(self.file_name) as _zip:
+                _manifest = json.loads(_zip.read(self._members[MANIFEST_FILE_NAME]).decode('utf8'))
+            _list_files_manifest = set()
+            for _element in _manifest['elements'].values():
+                _list_files_manifest.update(_element['file_names'])
+            if _list_files_manifest != self._list_csv():
+                _manifest = None
+
+        if _manifest is None:
+            _energies = dict([(_file, self._read(file_name=_file)[0]) for _file in self._list_csv()])
+            _manifest = _manifest_from_arrays(energies=_energies)
+
+        self._manifest = _manifest
+        self._manifest_version = _version
+        return _manifest
+
+    def get_version(self, file_name=''):
+        if file_name not in self._members:
+            raise IOError("File {} does not exist in {}!".format(file_name, self.file_name))
+        return os.path.getmtime(self.file_name)
+
+    def _read(self, file_name=''):
+        if file_name not in self._members:
+            raise IOError("File {} does not exist in {}!".format(file_name, self.file_name))
+        with zipfile.ZipFile(self.file_name) as _zip:
+            _raw = _zip.read(self._members[file_name])
+        _columns = _parse_csv_columns(source=io.BytesIO(_raw), skiprows=2)
+        return np.ascontiguousarray(_columns.T)
+
+
+class MemoryBackend(DatabaseBackend):
+    """database held in memory, without any I/O
+
+    Parameters:
+    ===========
+    data: dictionary {file_name: (energy, sigma)}
+      ex: {'Ag-107.csv': (np.array([1e-5, 1., 10.]), np.array([1938.91, 12.3, 4.5]))}
+    """
+
+    def __init__(self, data={}):
+        DatabaseBackend.__init__(self)
+        self._tables = {}
+        for _file, (_energy, _sigma) in data.items():
+            _energy = np.array(_energy, dtype=np.float64)
+            _sigma = np.array(_sigma)
+            if _sigma.dtype not in (np.dtype('float64'), np.dtype('float32')):
+                _sigma = _sigma.astype(np.float64)
+            if _energy.shape != _sigma.shape:
+                raise ValueError("Energy and sigma of {} do not have the same size!".format(_file))
+            _energy.flags.writeable = False
+            _sigma.flags.writeable = False
+            self._tables[_file] = {'E_eV': _energy,
+                                   'Sig_b': _sigma}
+        self._manifest = _manifest_from_arrays(
+            energies=dict([(_file, _table['E_eV']) for _file, _table in self._tables.items()]))
+
+    def get_manifest(self):
+        return self._manifest
+
+    def get_version(self, file_name=''):
+        if file_name not in self._tables:
+            raise IOError("File {} does not exist in memory database!".format(file_name))
+        return 0
+
+    def get_data(self, file_name='', E_min=None, E_max=None):
+        self.get_version(file_name=file_name)
+        return _window_table(table=self._tables[file_name], E_min=E_min, E_max=E_max)
+
+
+def get_backend(database='ENDF_VIII'):
+    """return the backend of the database
+
+    Parameters:
+    ===========
+    database: DatabaseBackend object, or string (default is 'ENDF_VIII'):
+      - name of the database (folder in reference_data) or full path of a folder -> CsvFolderBackend
+      - full path of a zip archive of csv files -> ZipBackend
+      - full path of a compiled database (see compile_database) -> CompiledBackend
+
+    Raises:
+    =======
+    ValueError if database can not be found
+    """
+    if isinstance(database, DatabaseBackend):
+        return database
+
+    _path = get_database_folder(database=database)
+    if _path in _backends:
+        return _backends[_path]
+
+    if os.path.isdir(_path):
+        _backend = CsvFolderBackend(folder=_path)
+    elif os.path.isfile(_path):
+        if zipfile.is_zipfile(_path):
+            _backend = ZipBackend(file_name=_path)
+        else:
+            _backend = CompiledBackend(file_name=_path)
+    else:
+        raise ValueError("Database {} does not exist!".format(database))
+
+    _backends[_path] = _backend
+    return _backend
+
+
+def get_backend_for_file(file_name=''):
+    """return the backend and the isotope file name of the full path of an isotope file
+
+    ex: '.../ENDF_VIII/Ag-107.csv' -> (CsvFolderBackend('.../ENDF_VIII'), 'Ag-107.csv')
+        '.../ENDF_VIII.bin/Ag-107.csv' -> (CompiledBackend('.../ENDF_VIII.bin'), 'Ag-107.csv')
+
+    Raises:
+    =======
+    IOError if the folder (or archive) of the file does not exist
+    """
+    _parent = os.path.dirname(os.path.abspath(file_name))
+    if not os.path.exists(_parent):
+        raise IOError("File {} does not exist!".format(file_name))
+    return get_backend(database=_parent), os.path.basename(file_name)
+
+
+def main(argv=None):
+    """command line entry point: pack a database folder into a single compiled file
+
+    $ imagingreso-pack-database ImagingReso/reference_data/ENDF_VIII -o ENDF_VIII.bin --dtype float32
+    """
+    _parser = argparse.ArgumentParser(description="Pack the isotope csv files of a database folder into "
+                                                  "a single indexed file usable as Resonance database")
+    _parser.add_argument('database', help="name (ex: ENDF_VIII) or path of the database folder")
+    _parser.add_argument('-o', '--output', default='',
+                         help="output file (default is {} inside the folder)".format(COMPILED_FILE_NAME))
+    _parser.add_argument('--dtype', default='float64', choices=['float64', 'float32'],
+                         help="type of the sigma (default is float64)")
+    _parser.add_argument('--compress', action='store_true', help="compress the arrays with zlib")
+    _parser.add_argument('--duplicates', default='keep', choices=['keep', 'drop', 'error'],
+                         help="rows with the same energy as the previous one (default is keep). float32 and "
+                              "drop need an output file outside the folder")
+    _args = _parser.parse_args(argv)
+
+    _database = _args.database
+    if os.path.isdir(_database):
+        _database = os.path.abspath(_database)
+    try:
+        _file_name = compile_database(database=_database, file_name=_args.output, dtype=_args.dtype,
+                                      compress=_args.compress, duplicates=_args.duplicates)
+    except ValueError as _error:
+        print("Error: {}".format(_error), file=sys.stderr)
+        return 1
+
+    _header = load_compiled_database(file_name=_file_name)['header']
+    print("{}: {} isotopes, {} rows".format(_file_name, len(_header['isotopes']), _header['nbr_rows']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
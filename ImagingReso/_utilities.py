@@ -1,13 +1,16 @@
-import glob
-import os
+import collections.abc
+import concurrent.futures
+import functools
+import hashlib
 import numbers
 import re
 import numpy as np
 import periodictable as pt
 import pandas as pd
-from scipy.interpolate import interp1d
 from scipy.constants import Avogadro
 
+from ImagingReso import _database
+
 
 def is_element_in_database(element='', database='ENDF_VIII'):
     """will try to find the element in the folder (database) specified
@@ -43,15 +46,8 @@ def get_list_element_from_database(database=''):
     ValueError if database can not be found
     
     """
-    _file_path = os.path.abspath(os.path.dirname(__file__))
-    _database_folder = os.path.join(_file_path, 'reference_data', database)
-
-    if not os.path.exists(_database_folder):
-        raise ValueError("Database {} does not exist!".format(database))
-
-    _list_files = glob.glob(_database_folder + '/*.csv')
-    _list_short_files = [os.path.basename(_file) for _file in _list_files]
-    _list_element = set([_name.split('-')[0].lower() for _name in _list_short_files])
+    _manifest = _database.get_manifest(database=database)
+    _list_element = set([_name.lower() for _name in _manifest['elements']])
     return _list_element
 
 
@@ -77,7 +73,7 @@ def checking_stack(stack={}, database='ENDF_VIII'):
     for _keys in stack:
         _elements = stack[_keys]['elements']
         for _element in _elements:
-            if not is_element_in_database(element=_element):
+            if not is_element_in_database(element=_element, database=database):
                 raise ValueError("Element {} can not be found in the database".format(_element))
 
         _thickness = stack[_keys]['thickness']['value']
@@ -163,10 +159,7 @@ def get_isotope_dicts(element='', database='ENDF_VIII'):
                   'file_names': ['Ag-107.csv','Ag-109.csv']}}
     
     """
-    _file_path = os.path.abspath(os.path.dirname(__file__))
-    _database_folder = os.path.join(_file_path, 'reference_data', database)
-    _element_search_path = os.path.join(_database_folder, element + '-*.csv')
-    list_files = glob.glob(_element_search_path)
+    _manifest = _database.get_manifest(database=database)
     isotope_dict = {'isotopes': {'list': [],
                                  'file_names': [],
                                  'density': {'value': np.NaN,
@@ -181,7 +174,6 @@ def get_isotope_dicts(element='', database='ENDF_VIII'):
                                    'units': 'g/mol'},
                     }
 
-    isotope_dict_mirror = {}
     _isotopes_list = []
     _isotopes_list_files = []
     _isotopes_mass = []
@@ -190,21 +182,15 @@ def get_isotope_dicts(element='', database='ENDF_VIII'):
     _density = np.NaN
     _molar_mass = np.NaN
 
-    for file in list_files:
-        # Obtain element, z number from the basename
-        _basename = os.path.basename(file)
-        [filename, file_extension] = os.path.splitext(_basename)
-        [_name, _number] = filename.split('-')
-        _symbol = _number + '-' + _name
-        isotope = str(_symbol)
-
-        _isotopes_list.append(isotope)
-        _isotopes_list_files.append(_basename)
-        _isotopes_mass.append(get_mass(isotope))
-        _isotopes_atomic_ratio.append(get_abundance(isotope))
-        _isotopes_density.append(get_density(isotope))
-        _density = get_density(element)
-        _molar_mass = get_mass(element)
+    if element in _manifest['elements']:
+        _element = _manifest['elements'][element]
+        _isotopes_list = list(_element['isotopes'])
+        _isotopes_list_files = list(_element['file_names'])
+        _isotopes_mass = list(_element['mass'])
+        _isotopes_atomic_ratio = list(_element['isotopic_ratio'])
+        _isotopes_density = list(_element['density'])
+        _density = _element['element_density']
+        _molar_mass = _element['element_molar_mass']
 
     isotope_dict['isotopes']['list'] = _isotopes_list
     isotope_dict['isotopes']['file_names'] = _isotopes_list_files
@@ -271,6 +257,94 @@ def get_compound_density(list_density=[], list_ratio=[]):
     return _density_compound
 
 
+# 'database': raw tables of the isotope files, shared by the backends (see _database.DatabaseBackend)
+# 'sigma': interpolated sigma of each isotope, keyed by (backend, file name, version, energy axis, dtype)
+# 'energy': energy axis of get_energy_grid, keyed by (grid, E_min, E_max, E_step or points per decade, dtype)
+_caches = {'database': _database.table_cache,
+           'sigma': _database.LRUCache(max_bytes=256 * 1024 ** 2),
+           'energy': _database.LRUCache(max_bytes=64 * 1024 ** 2),
+           }
+
+
+def cache_info(cache='database'):
+    """return the statistics of the in-process cache
+    
+    Parameters:
+    ===========
+    cache: string (default is 'database'). Name of the cache
+      'database': raw tables of the isotope csv files (see get_database_data)
+      'sigma': interpolated sigma arrays (see get_sigma)
+      'energy': energy axis arrays (see get_energy_grid)
+    
+    Returns:
+    ========
+    {'hits': int, 'misses': int, 'entries': int, 'nbytes': int, 'max_bytes': int}
+    
+    Raises:
+    =======
+    ValueError if cache does not exist
+    """
+    if cache not in _caches:
+        raise ValueError("Cache {} does not exist! Use any of {}".format(cache, ', '.join(_caches)))
+    return _caches[cache].info()
+
+
+def cache_clear(cache=None):
+    """empty the in-process cache
+    
+    Parameters:
+    ===========
+    cache: string (default is None). Name of the cache to empty. If None, all the caches are emptied
+    """
+    if cache is None:
+        for _cache in _caches.values():
+            _cache.clear()
+        return
+    if cache not in _caches:
+        raise ValueError("Cache {} does not exist! Use any of {}".format(cache, ', '.join(_caches)))
+    _caches[cache].clear()
+
+
+def set_cache_max_bytes(max_bytes=0, cache='database'):
+    """define the budget (in bytes) of the in-process cache. Least recently used entries are evicted first
+    
+    Parameters:
+    ===========
+    max_bytes: int. Maximum size of the arrays kept in the cache (0 disables the cache)
+    cache: string (default is 'database'). Name of the cache
+    """
+    if cache not in _caches:
+        raise ValueError("Cache {} does not exist! Use any of {}".format(cache, ', '.join(_caches)))
+    _caches[cache].set_max_bytes(max_bytes=max_bytes)
+
+
+def _get_database_table(file_name='', E_min=None, E_max=None, database=None):
+    """return the energy (eV) and Sigma (barn) arrays of the file_name
+    
+    The arrays are read-only and shared by all the callers (see _database.DatabaseBackend.get_data).
+    If E_min and/or E_max are provided, only the rows bracketing [E_min, E_max] are returned.
+    
+    Parameters:
+    ===========
+    file_name: string. Full path of the isotope file, or name of the isotope file (ex: 'Ag-107.csv')
+      when database is provided
+    database: string or DatabaseBackend (default is None). Database of the isotope file
+    
+    Returns:
+    ========
+    {'E_eV': np.array, 'Sig_b': np.array}
+    
+    Raises:
+    =======
+    IOError if file does not exist
+    """
+    if database is None:
+        _backend, _file_name = _database.get_backend_for_file(file_name=file_name)
+    else:
+        _backend, _file_name = _database.get_backend(database=database), file_name
+    return _backend.get_data(file_name=_file_name, E_min=E_min, E_max=E_max)
+
+
 def get_database_data(file_name=''):
     """return the energy (eV) and Sigma (barn) from the file_name
     
@@ -286,13 +360,289 @@ def get_database_data(file_name=''):
     =======
     IOError if file does not exist
     """
-    if not os.path.exists(file_name):
-        raise IOError("File {} does not exist!".format(file_name))
-    df = pd.read_csv(file_name, header=1)
+    _table = _get_database_table(file_name=file_name)
+    df = pd.DataFrame({'E_eV': np.array(_table['E_eV']),
+                       'Sig_b': np.array(_table['Sig_b'])})
     return df
 
 
-def get_interpolated_data(df=pd.DataFrame, E_min=np.NaN, E_max=np.NaN, E_step=np.NaN):
+def get_energy_grid(E_min=np.NaN, E_max=np.NaN, E_step=np.NaN, dtype=np.float64, grid='linear',
+                    points_per_decade=None):
+    """return the energy axis [E_min, E_max] with step defined
+    
+    The array is read-only and shared by all the isotopes interpolated over the same range.
+    
+    Parameters:
+    ===========
+    E_min: left range of the energy axis
+    E_max: right range of the energy axis
+    E_step: step of energy (linear grid)
+    dtype: numpy type (default is np.float64) of the array returned
+    grid: string (default is 'linear'). 'linear' -> constant step E_step
+                                        'log' -> points_per_decade points per decade of energy
+    points_per_decade: int (default is None). Number of points per decade of the 'log' grid
+    
+    Returns:
+    ========
+    np.array
+    
+    Raises:
+    =======
+    ValueError if grid is not supported
+    """
+    if grid == 'linear':
+        _key = (grid, E_min, E_max, E_step, np.dtype(dtype).str)
+    elif grid == 'log':
+        if points_per_decade is None or points_per_decade <= 0:
+            raise ValueError("points_per_decade must be > 0 for a 'log' grid!")
+        _key = (grid, E_min, E_max, points_per_decade, np.dtype(dtype).str)
+    else:
+        raise ValueError("grid {} not supported ['linear', 'log']!".format(grid))
+    _cache = _caches['energy']
+    _energy = _cache.get(_key)
+    if _energy is None:
+        _energy = _get_energy_grid(E_min, E_max, E_step, dtype, grid, points_per_decade)
+        _cache.put(_key, _energy, nbytes=_energy.nbytes)
+    return _energy
+
+
+def _get_energy_grid(E_min, E_max, E_step, dtype, grid, points_per_decade):
+    nbr_point = _get_energy_grid_size(E_min, E_max, E_step, grid, points_per_decade)
+    if grid == 'log':
+        _energy = np.logspace(np.log10(E_min), np.log10(E_max), nbr_point)
+        # no rounding error on the boundaries
+        _energy[0], _energy[-1] = E_min, E_max
+    else:
+        _energy = np.linspace(E_min, E_max, nbr_point)
+    _energy = _energy.astype(dtype, copy=False)
+    _energy.flags.writeable = False
+    return _energy
+
+
+def _get_energy_grid_size(E_min, E_max, E_step, grid, points_per_decade):
+    """number of points of the energy axis of get_energy_grid"""
+    if grid == 'log':
+        return max(int(round(np.log10(E_max / E_min) * points_per_decade)) + 1, 2)
+    return int((E_max - E_min) / E_step + 1)
+
+
+def get_energy_grid_chunks(E_min=np.NaN, E_max=np.NaN, E_step=np.NaN, grid='linear', points_per_decade=None,
+                           chunk_size=100000):
+    """yield the energy axis of get_energy_grid (float64) by chunks, without building the entire axis
+    
+    The points are calculated as np.linspace (and np.logspace for the 'log' grid) does, so that the chunks
+    put end to end are the energy axis of get_energy_grid.
+    
+    Parameters:
+    ===========
+    E_min: left range of the energy axis
+    E_max: right range of the energy axis
+    E_step: step of energy (linear grid)
+    grid: string (default is 'linear'). 'linear' or 'log' (see get_energy_grid)
+    points_per_decade: int (default is None). Number of points per decade of the 'log' grid
+    chunk_size: int (default is 100000). Maximum number of points of each chunk
+    
+    Raises:
+    =======
+    ValueError if grid is not supported
+    ValueError if chunk_size is not > 0
+    """
+    if grid not in ('linear', 'log'):
+        raise ValueError("grid {} not supported ['linear', 'log']!".format(grid))
+    if grid == 'log' and (points_per_decade is None or points_per_decade <= 0):
+        raise ValueError("points_per_decade must be > 0 for a 'log' grid!")
+    if not chunk_size > 0:
+        raise ValueError("Chunk size must be > 0!")
+
+    nbr_point = _get_energy_grid_size(E_min, E_max, E_step, grid, points_per_decade)
+    if grid == 'log':
+        _start, _stop = np.log10(E_min), np.log10(E_max)
+    else:
+        _start, _stop = E_min * 1.0, E_max * 1.0
+    _step = (_stop - _start) / (nbr_point - 1)
+
+    for _index in range(0, nbr_point, chunk_size):
+        _index_stop = min(_index + chunk_size, nbr_point)
+        _energy = np.arange(_index, _index_stop, dtype=np.float64) * _step + _start
+        if _index_stop == nbr_point:
+            _energy[-1] = _stop
+        if grid == 'log':
+            _energy = np.power(10.0, _energy)
+            # no rounding error on the boundaries
+            if _index == 0:
+                _energy[0] = E_min
+            if _index_stop == nbr_point:
+                _energy[-1] = E_max
+        yield _energy
+
+
+def get_energy_axis(energy=[]):
+    """return a read-only float64 copy of the energy axis provided by the user
+    
+    Raises:
+    =======
+    ValueError if energy is not a 1D array of at least 2 energies in strictly ascending order
+    """
+    _energy = np.array(energy, dtype=np.float64)
+    if _energy.ndim != 1 or len(_energy) < 2:
+        raise ValueError("Energy axis must be a 1D array of at least 2 energies!")
+    if not np.all(np.diff(_energy) > 0):
+        raise ValueError("Energy axis must be sorted in strictly ascending order!")
+    _energy.flags.writeable = False
+    return _energy
+
+
+def get_native_energy_axis(tables=[], E_min=np.NaN, E_max=np.NaN):
+    """return the union of the tabulated energies of the tables between E_min and E_max
+    
+    As the tabulated sigma are linear between the tabulated energies, interpolating them over this axis
+    gives the exact sigma of every table at every point, with no point added between the tabulated ones.
+    
+    Parameters:
+    ===========
+    tables: list of {'E_eV': np.array, 'Sig_b': np.array} sorted by energy
+    E_min: left range of the energy axis
+    E_max: right range of the energy axis
+    
+    Returns:
+    ========
+    read-only np.array (E_min and E_max included)
+    
+    Raises:
+    =======
+    ValueError if [E_min, E_max] is outside the range of one of the tables
+    """
+    _energy = np.array([E_min, E_max], dtype=np.float64)
+    for _table in tables:
+        _table_energy = np.asarray(_table['E_eV'], dtype=np.float64)
+        if E_min < _table_energy[0] or E_max > _table_energy[-1]:
+            raise ValueError("Energy range [{}, {}] eV is outside the database range [{}, {}] eV!".format(
+                E_min, E_max, _table_energy[0], _table_energy[-1]))
+        _start, _end = np.searchsorted(_table_energy, [E_min, E_max], side='right')
+        _energy = _merge_sorted(_energy, _table_energy[_start:_end])
+    _energy.flags.writeable = False
+    return _energy
+
+
+def _merge_sorted(left=[], right=[]):
+    """merge two sorted arrays into a sorted array without duplicates"""
+    _merged = np.insert(left, np.searchsorted(left, right), right)
+    if len(_merged) == 0:
+        return _merged
+    return _merged[np.append(True, np.diff(_merged) != 0)]
+
+
+def get_adaptive_energy_axis(tables=[], E_min=np.NaN, E_max=np.NaN, tolerance=1e-3):
+    """return a union of the tabulated energies of the tables between E_min and E_max such that the linear
+    interpolation of each table over this axis matches its tabulated sigma within tolerance
+    
+    The axis is dense around the resonance peaks and sparse on the smooth (1/v) regions.
+    
+    Parameters:
+    ===========
+    tables: list of {'E_eV': np.array, 'Sig_b': np.array} sorted by energy
+    E_min: left range of the energy axis
+    E_max: right range of the energy axis
+    tolerance: float (default is 1e-3). Maximum relative error of the interpolated sigma
+    
+    Returns:
+    ========
+    read-only np.array
+    
+    Raises:
+    =======
+    ValueError if tolerance is not > 0 or [E_min, E_max] is outside the range of one of the tables
+    """
+    if not tolerance > 0:
+        raise ValueError("Tolerance must be > 0!")
+    _tables = []
+    for _table in tables:
+        _table_energy = np.asarray(_table['E_eV'], dtype=np.float64)
+        _table_sigma = np.asarray(_table['Sig_b'], dtype=np.float64)
+        if E_min < _table_energy[0] or E_max > _table_energy[-1]:
+            raise ValueError("Energy range [{}, {}] eV is outside the database range [{}, {}] eV!".format(
+                E_min, E_max, _table_energy[0], _table_energy[-1]))
+        # only the last row of a duplicate energy is used, as np.interp does
+        _inside = (_table_energy > E_min) & (_table_energy < E_max)
+        _inside[:-1] &= np.diff(_table_energy) != 0
+        _energy = np.concatenate(([E_min], _table_energy[_inside], [E_max]))
+        _sigma = np.concatenate(([np.interp(E_min, _table_energy, _table_sigma)],
+                                 _table_sigma[_inside],
+                                 [np.interp(E_max, _table_energy, _table_sigma)]))
+        _tables.append((_energy, _sigma))
+
+    # every table is refined starting from the axis of all the tables, until none of them needs another point:
+    # the points added for a table can increase the error of another table between them
+    _axis = np.array([E_min, E_max], dtype=np.float64)
+    _refined = False
+    while not _refined:
+        _refined = True
+        for _energy, _sigma in _tables:
+            # the table is piecewise-linear, its points on the axis do not change it
+            _points = _merge_sorted(_energy, _axis)
+            _kept = _refine_points(energy=_points, sigma=np.interp(_points, _energy, _sigma), tolerance=tolerance,
+                                   kept=np.searchsorted(_points, _axis))
+            if len(_kept) > len(_axis):
+                _axis = _points[_kept]
+                _refined = False
+    _axis.flags.writeable = False
+    return _axis
+
+
+def _refine_points(energy=[], sigma=[], tolerance=1e-3, kept=None):
+    """indexes of the points of the piecewise-linear sigma(energy) kept by the adaptive axis
+    
+    Starting from the boundaries (or the sorted indexes kept), the point with the largest error of each
+    interval is added until the linear interpolation over the points kept matches sigma within tolerance.
+    As sigma is piecewise-linear, checking the error at the tabulated points is enough.
+    """
+    _nbr_points = len(energy)
+    _index = np.arange(_nbr_points)
+    _kept = np.array([0, _nbr_points - 1]) if kept is None else np.asarray(kept)
+    _limit = tolerance * np.abs(sigma)
+    while True:
+        _error = np.abs(np.interp(energy, energy[_kept], sigma[_kept]) - sigma) - _limit
+        _error[_kept] = -np.inf
+        if not np.any(_error > 0):
+            return _kept
+        # interval of each point and largest error of each interval
+        _interval = np.searchsorted(_kept, _index, side='right') - 1
+        _max_error = np.maximum.reduceat(_error, _kept[:-1])
+        _worst = (_error == _max_error[np.minimum(_interval, len(_kept) - 2)]) & (_error > 0)
+        _intervals, _first = np.unique(_interval[_worst], return_index=True)
+        _kept = np.union1d(_kept, _index[_worst][_first])
+
+
+def interpolate_tables(tables=[], energy=[], dtype=np.float64):
+    """interpolate linearly the sigma of all the tables over the same energy axis
+    
+    Parameters:
+    ===========
+    tables: list of {'E_eV': np.array, 'Sig_b': np.array} (or data frames) sorted by energy
+    energy: np.array. Energy axis (eV) sorted in ascending order
+    dtype: numpy type (default is np.float64) of the array returned
+    
+    Returns:
+    ========
+    np.array of shape (number of tables, number of energies)
+    
+    Raises:
+    =======
+    ValueError if energy is outside the range of one of the tables
+    """
+    _energy = np.asarray(energy, dtype=np.float64)
+    _sigmas = np.empty((len(tables), len(_energy)), dtype=dtype)
+    for _row, _table in enumerate(tables):
+        _table_energy = np.asarray(_table['E_eV'])
+        if len(_energy) > 0 and (_energy[0] < _table_energy[0] or _energy[-1] > _table_energy[-1]):
+            raise ValueError("Energy range [{}, {}] eV is outside the database range [{}, {}] eV!".format(
+                _energy[0], _energy[-1], _table_energy[0], _table_energy[-1]))
+        _sigmas[_row] = np.interp(_energy, _table_energy, np.asarray(_table['Sig_b']))
+    return _sigmas
+
+
+def get_interpolated_data(df=pd.DataFrame, E_min=np.NaN, E_max=np.NaN, E_step=np.NaN, grid='linear',
+                          points_per_decade=None, energy=None):
     """return the interpolated x and y axis for the given x range [E_min, E_max] with step defined
     
     Parameters:
@@ -301,38 +651,154 @@ def get_interpolated_data(df=pd.DataFrame, E_min=np.NaN, E_max=np.NaN, E_step=np
     E_min: left range of new interpolated data
     E_max: right range of new interpolated data
     E_step: step of energy to use in interpolated data
+    grid: string (default is 'linear'). 'linear' or 'log' (see get_energy_grid)
+    points_per_decade: int (default is None). Number of points per decade of the 'log' grid
+    energy: np.array (default is None). If provided, energy axis used instead of E_min, E_max, E_step and grid
     
     Returns:
     ========
     x_axis and y_axis of interpolated data over specified range
     """
-    nbr_point = int((E_max - E_min) / E_step + 1)
-    x_axis = np.linspace(E_min, E_max, nbr_point)
-    y_axis_function = interp1d(x=df['E_eV'], y=df['Sig_b'], kind='linear')
-    y_axis = y_axis_function(x_axis)
+    if energy is None:
+        x_axis = get_energy_grid(E_min=E_min, E_max=E_max, E_step=E_step, grid=grid,
+                                 points_per_decade=points_per_decade)
+    else:
+        x_axis = get_energy_axis(energy=energy)
+    y_axis = interpolate_tables(tables=[df], energy=x_axis)[0]
 
     return {'x_axis': x_axis, 'y_axis': y_axis}
 
 
-def get_sigma(database_file_name='', E_min=np.NaN, E_max=np.NaN, E_step=np.NaN):
+def get_sigmas(database_file_names=[], E_min=np.NaN, E_max=np.NaN, E_step=np.NaN, dtype=np.float64,
+               database=None, grid='linear', points_per_decade=None, energy=None, max_workers=None):
+    """retrieve the Energy axis and the sigma of all the given isotopes over this axis
+    
+    The sigma of each isotope is cached (see cache_info('sigma')). The arrays returned are read-only, the
+    (isotopes x energies) array is filled from the cache for each call. The isotopes that are not cached
+    are loaded and interpolated concurrently by a pool of threads.
+    
+    Paramters:
+    ==========
+    database_file_names: list of string. Full paths of the isotope files, or names of the isotope
+      files (ex: ['Ag-107.csv', 'Ag-109.csv']) when database is provided
+    E_min: left range of new interpolated data
+    E_max: right range of new interpolated data
+    E_step: step of energy to use in interpolated data
+    dtype: numpy type (default is np.float64) of the arrays returned (np.float32 halves the memory used)
+    database: string or DatabaseBackend (default is None). Database of the isotope files
+      (see _database.get_backend)
+    grid: string (default is 'linear'). 'linear' or 'log' (see get_energy_grid)
+    points_per_decade: int (default is None). Number of points per decade of the 'log' grid
+    energy: np.array (default is None). If provided, energy axis used instead of E_min, E_max, E_step and grid
+    max_workers: int (default is None). Maximum number of threads loading the isotopes
+      (None -> default of concurrent.futures.ThreadPoolExecutor, 1 -> no thread)
+    
+    Returns:
+    ========
+    {'energy_eV': np.array, 'sigma_b': np.array of shape (number of isotopes, number of energies)}
+    """
+    _energy, _sigmas, _rows = _interpolate_sigmas(database_file_names=database_file_names,
+                                                  E_min=E_min, E_max=E_max, E_step=E_step,
+                                                  dtype=dtype, database=database, grid=grid,
+                                                  points_per_decade=points_per_decade, energy=energy,
+                                                  max_workers=max_workers)
+    return {'energy_eV': _energy,
+            'sigma_b': _sigmas}
+
+
+def get_sigma(database_file_name='', E_min=np.NaN, E_max=np.NaN, E_step=np.NaN, dtype=np.float64, database=None,
+              grid='linear', points_per_decade=None, energy=None):
     """retrieve the Energy and sigma axis for the given isotope
     
+    The result is cached (see cache_info('sigma')), the arrays returned are read-only and shared
+    between all the callers asking for the same isotope and energy range.
+    
     Paramters:
     ==========
-    database_file_name: string
+    database_file_name: string. Full path of the isotope file, or name of the isotope file (ex: 'Ag-107.csv')
+      when database is provided
     E_min: left range of new interpolated data
     E_max: right range of new interpolated data
     E_step: step of energy to use in interpolated data
+    dtype: numpy type (default is np.float64) of the arrays returned (np.float32 halves the memory used)
+    database: string or DatabaseBackend (default is None). Database of the isotope file
+      (see _database.get_backend)
+    grid: string (default is 'linear'). 'linear' or 'log' (see get_energy_grid)
+    points_per_decade: int (default is None). Number of points per decade of the 'log' grid
+    energy: np.array (default is None). If provided, energy axis used instead of E_min, E_max, E_step and grid
     
     Returns:
     ========
     {'energy': np.array(), 'sigma': np.array}
     """
-    _df = get_database_data(file_name=database_file_name)
-    _dict = get_interpolated_data(df=_df, E_min=E_min, E_max=E_max,
-                                  E_step=E_step)
-    return {'energy_eV': _dict['x_axis'],
-            'sigma_b': _dict['y_axis']}
+    _energy, _sigmas, _rows = _interpolate_sigmas(database_file_names=[database_file_name],
+                                                  E_min=E_min, E_max=E_max, E_step=E_step,
+                                                  dtype=dtype, database=database, grid=grid,
+                                                  points_per_decade=points_per_decade, energy=energy)
+    return {'energy_eV': _energy,
+            'sigma_b': _rows[0]}
+
+
+def _interpolate_sigmas(database_file_names=[], E_min=np.NaN, E_max=np.NaN, E_step=np.NaN, dtype=np.float64,
+                        database=None, grid='linear', points_per_decade=None, energy=None, max_workers=1):
+    """energy axis, (isotopes x energies) sigma array and cached sigma of each isotope (see get_sigmas)"""
+    # sigma is always interpolated over the float64 energy axis
+    if energy is None:
+        _energy_64 = get_energy_grid(E_min=E_min, E_max=E_max, E_step=E_step, grid=grid,
+                                     points_per_decade=points_per_decade)
+        _energy = get_energy_grid(E_min=E_min, E_max=E_max, E_step=E_step, dtype=dtype, grid=grid,
+                                  points_per_decade=points_per_decade)
+        _grid_key = (grid, E_min, E_max, E_step if grid == 'linear' else points_per_decade)
+    else:
+        _energy_64 = get_energy_axis(energy=energy)
+        _energy = _energy_64.astype(dtype)
+        _energy.flags.writeable = False
+        E_min, E_max = _energy_64[0], _energy_64[-1]
+        _grid_key = ('energy', len(_energy_64), hashlib.sha1(_energy_64.tobytes()).hexdigest())
+    _cache = _caches['sigma']
+
+    _rows = []
+    _keys = []
+    _missing = []
+    for _index, _file in enumerate(database_file_names):
+        if database is None:
+            _backend, _file_name = _database.get_backend_for_file(file_name=_file)
+        else:
+            _backend, _file_name = _database.get_backend(database=database), _file
+        _key = (_backend.key, _file_name, _backend.get_version(file_name=_file_name),
+                _grid_key,
+                np.dtype(dtype).str)
+        _keys.append(_key)
+        _rows.append(_cache.get(_key))
+        if _rows[-1] is None:
+            _missing.append((_index, _backend, _file_name))
+
+    _sigmas = np.empty((len(_rows), len(_energy)), dtype=dtype)
+    for _index, _row in enumerate(_rows):
+        if _row is not None:
+            _sigmas[_index] = _row
+
+    def _load_sigma(missing):
+        # only the rows bracketing the energy range are loaded and interpolated
+        _index, _backend, _file_name = missing
+        _table = _backend.get_data(file_name=_file_name, E_min=E_min, E_max=E_max)
+        _sigmas[_index] = interpolate_tables(tables=[_table], energy=_energy_64, dtype=dtype)[0]
+
+    if max_workers == 1 or len(_missing) < 2:
+        for _missing_file in _missing:
+            _load_sigma(_missing_file)
+    else:
+        # every thread fills its own rows of the sigma array
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as _executor:
+            list(_executor.map(_load_sigma, _missing))
+    _sigmas.flags.writeable = False
+
+    for _index, _backend, _file_name in _missing:
+        # the cache keeps its own copy of the row: a view would keep the entire sigma array alive
+        _rows[_index] = np.array(_sigmas[_index])
+        _rows[_index].flags.writeable = False
+        _cache.put(_keys[_index], _rows[_index], nbytes=_rows[_index].nbytes)
+    return _energy, _sigmas, _rows
 
 
 def get_atoms_per_cm3_of_layer(compound_dict={}):
@@ -364,6 +830,42 @@ def get_atoms_per_cm3_of_layer(compound_dict={}):
     return atoms_per_cm3
 
 
+def get_areal_density_of_layer(thickness_cm=[], density=[], stoichiometric_ratio=[], molar_mass=[],
+                               isotopic_ratio=[]):
+    """calculate the number of atoms per barn (thickness_cm * atoms_per_cm3 * 1e-24) of every isotope of a
+    layer, for many variants of the layer at once
+
+    Parameters:
+    ===========
+    thickness_cm: np.array (variants) of the thickness of the layer in cm
+    density: np.array (variants) of the density of the layer in g/cm3
+    stoichiometric_ratio: np.array (variants x elements) of the stoichiometric ratio of the elements
+    molar_mass: np.array (variants x elements) of the molar mass of the elements
+    isotopic_ratio: list, for each element, of np.array (variants x isotopes) of the isotopic ratio
+
+    Returns:
+    ========
+    np.array (variants x isotopes of all the elements) of the number of atoms per barn, in the order of the
+    rows of the sigma array of the layer
+    """
+    _thickness_cm = np.asarray(thickness_cm, dtype=np.float64)
+    _density = np.asarray(density, dtype=np.float64)
+    _stoichiometric_ratio = np.asarray(stoichiometric_ratio, dtype=np.float64)
+    _molar_mass = np.asarray(molar_mass, dtype=np.float64)
+
+    _molar_mass_sum = 0
+    for _index in range(len(isotopic_ratio)):
+        _molar_mass_sum = _molar_mass_sum + _stoichiometric_ratio[:, _index] * _molar_mass[:, _index]
+
+    _areal_density = []
+    for _index, _ratio in enumerate(isotopic_ratio):
+        _step1 = (_density * _stoichiometric_ratio[:, _index]) / _molar_mass_sum
+        _atoms_per_cm3 = Avogadro * _step1
+        _areal_density.append((_thickness_cm * 1e-24 * _atoms_per_cm3)[:, np.newaxis] *
+                              np.asarray(_ratio, dtype=np.float64))
+    return np.concatenate(_areal_density, axis=1)
+
+
 def calculate_transmission(thickness_cm=np.NaN, atoms_per_cm3=np.NaN, sigma_b=[]):
     """calculate the transmission signal using the formula
     
@@ -377,10 +879,210 @@ def calculate_transmission(thickness_cm=np.NaN, atoms_per_cm3=np.NaN, sigma_b=[]
     
     Returns:
     ========
-    transmission array
+    transmission array (float32 if sigma_b is float32, float64 otherwise)
     """
+    _dtype = np.result_type(getattr(sigma_b, 'dtype', np.float64), np.float32)
     transmission = np.exp(-thickness_cm * 1e-24 * sigma_b * atoms_per_cm3)
-    return np.array(transmission)
+    return np.array(transmission, dtype=_dtype)
+
+
+def calculate_optical_depth(areal_density=[], sigma_b=[]):
+    """calculate the optical depth of a set of isotopes using the formula
+    
+    optical_depth = sum over the isotopes of (areal_density * sigma_b)
+    
+    so that transmission = exp(- optical_depth)
+    
+    Parameters:
+    ===========
+    areal_density: float or np.array of the number of atoms per barn (thickness_cm * atoms_per_cm3 * 1e-24)
+      of each isotope
+    sigma_b: np.array (energies) or (isotopes x energies) of sigma retrieved from database
+    
+    Returns:
+    ========
+    optical depth array (float32 if sigma_b is float32, float64 otherwise)
+    """
+    _sigma_b = np.asarray(sigma_b)
+    _dtype = np.result_type(_sigma_b.dtype, np.float32)
+    return np.dot(np.asarray(areal_density, dtype=_dtype), _sigma_b.astype(_dtype, copy=False))
+
+
+def calculate_chunk_transmission(areal_density=[], sigma_b=[], optical_depth=0.):
+    """calculate the transmission of a chunk of variants using the formula
+    
+    transmission = exp(- (areal_density . sigma_b + optical_depth))
+    
+    Parameters:
+    ===========
+    areal_density: np.array (variants x isotopes) of the number of atoms per barn of each isotope
+    sigma_b: np.array (isotopes x energies) of sigma retrieved from database
+    optical_depth: float or np.array (energies) of the optical depth added to every variant
+    
+    Returns:
+    ========
+    np.array (variants x energies) of transmission
+    """
+    return np.exp(-(calculate_optical_depth(areal_density=areal_density, sigma_b=sigma_b) + optical_depth))
+
+
+def calculate_sweep_transmission(areal_density=[], sigma_b=[], optical_depth=0., processes=None, chunk_size=256):
+    """calculate the transmission of many variants, chunk by chunk (see calculate_chunk_transmission)
+    
+    With processes, the chunks are calculated by a pool of processes. The arrays are shared with the processes
+    through multiprocessing.shared_memory, and every process writes its chunks into the shared transmission
+    array. The chunks are the same with or without processes, so is the transmission.
+    
+    Parameters:
+    ===========
+    areal_density: np.array (variants x isotopes) of the number of atoms per barn of each isotope
+    sigma_b: np.array (isotopes x energies) of sigma retrieved from database
+    optical_depth: float or np.array (energies) of the optical depth added to every variant
+    processes: int (default is None). Number of processes (None -> no process)
+    chunk_size: int (default is 256). Number of variants of each chunk
+    
+    Returns:
+    ========
+    np.array (variants x energies) of transmission
+    
+    Raises:
+    =======
+    ValueError if processes or chunk_size is not > 0
+    """
+    if processes is not None and not processes > 0:
+        raise ValueError("Number of processes must be > 0!")
+    if not chunk_size > 0:
+        raise ValueError("Chunk size must be > 0!")
+
+    _sigma_b = np.asarray(sigma_b)
+    _dtype = np.result_type(_sigma_b.dtype, np.float32)
+    _arrays = {'areal_density': np.asarray(areal_density, dtype=_dtype),
+               'sigma_b': _sigma_b.astype(_dtype, copy=False),
+               'optical_depth': np.broadcast_to(np.asarray(optical_depth, dtype=_dtype), _sigma_b.shape[1:])}
+    _n_variants = len(_arrays['areal_density'])
+    _shape = (_n_variants, _sigma_b.shape[1])
+    _chunks = [(_start, min(_start + chunk_size, _n_variants)) for _start in range(0, _n_variants, chunk_size)]
+
+    if processes is None:
+        _transmission = np.empty(_shape, dtype=_dtype)
+        for _start, _stop in _chunks:
+            _transmission[_start:_stop] = calculate_chunk_transmission(
+                areal_density=_arrays['areal_density'][_start:_stop],
+                sigma_b=_arrays['sigma_b'],
+                optical_depth=_arrays['optical_depth'])
+        return _transmission
+
+    from multiprocessing import shared_memory
+    _shared = {}
+    try:
+        for _name, _array in _arrays.items():
+            _shared[_name] = shared_memory.SharedMemory(create=True, size=max(_array.nbytes, 1))
+            np.ndarray(_array.shape, dtype=_dtype, buffer=_shared[_name].buf)[...] = _array
+        _shared['transmission'] = shared_memory.SharedMemory(create=True,
+                                                             size=max(int(np.prod(_shape)) * _dtype.itemsize, 1))
+        _specs = dict([(_name, (_shared[_name].name, _arrays[_name].shape, _dtype.str)) for _name in _arrays])
+        _specs['transmission'] = (_shared['transmission'].name, _shape, _dtype.str)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as _executor:
+            list(_executor.map(functools.partial(_calculate_shared_chunk_transmission, specs=_specs),
+                               [_start for _start, _stop in _chunks],
+                               [_stop for _start, _stop in _chunks]))
+
+        return np.array(np.ndarray(_shape, dtype=_dtype, buffer=_shared['transmission'].buf))
+    finally:
+        for _shm in _shared.values():
+            _shm.close()
+            _shm.unlink()
+
+
+def _calculate_shared_chunk_transmission(start=0, stop=0, specs={}):
+    """calculate the chunk [start, stop) of the transmission of calculate_sweep_transmission in a process
+
+    specs: dictionary {name: (shared memory name, shape, dtype)} of the shared arrays
+    """
+    from multiprocessing import shared_memory
+    _shared = {}
+    _arrays = {}
+    try:
+        for _name, (_shm_name, _shape, _dtype) in specs.items():
+            _shared[_name] = shared_memory.SharedMemory(name=_shm_name)
+            _arrays[_name] = np.ndarray(_shape, dtype=np.dtype(_dtype), buffer=_shared[_name].buf)
+        _arrays['transmission'][start:stop] = calculate_chunk_transmission(
+            areal_density=_arrays['areal_density'][start:stop],
+            sigma_b=_arrays['sigma_b'],
+            optical_depth=_arrays['optical_depth'])
+    finally:
+        # the buffers can not be released while the arrays use them
+        _arrays.clear()
+        for _shm in _shared.values():
+            _shm.close()
+
+
+class LazyDict(collections.abc.Mapping):
+    """read-only dictionary whose values are calculated the first time they are accessed, then kept
+
+    Parameters:
+    ===========
+    factories: dictionary {key: function without argument returning the value of key}
+    """
+
+    def __init__(self, factories={}):
+        self._factories = dict(factories)
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            self._values[key] = self._factories[key]()
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._factories)
+
+    def __len__(self):
+        return len(self._factories)
+
+    def is_calculated(self, key):
+        """return True if the value of key has already been calculated"""
+        return key in self._values
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def lazy_signal(optical_depth=None, energy_eV=None, children={}):
+    """return the LazyDict of a level of stack_signal: its children (compounds, elements or isotopes) and
+    its 'optical_depth', 'transmission', 'attenuation' and 'energy_eV'
+
+    transmission = exp(- optical_depth) and attenuation = 1 - transmission are calculated from the optical
+    depth, so that thin layers keep their precision and thick layers their optical depth even when their
+    transmission underflows to 0.
+
+    Parameters:
+    ===========
+    optical_depth: function without argument returning the optical depth array
+    energy_eV: np.array. Energy axis
+    children: dictionary {name: function without argument returning the LazyDict of the child}
+    """
+    _signal = LazyDict(factories=children)
+    # partials of module functions rather than lambdas, so that the signal (and the Resonance) can be pickled
+    _signal._factories['optical_depth'] = optical_depth
+    _signal._factories['transmission'] = functools.partial(_signal_transmission, _signal)
+    _signal._factories['attenuation'] = functools.partial(_signal_attenuation, _signal)
+    _signal._factories['energy_eV'] = functools.partial(constant, energy_eV)
+    return _signal
+
+
+def constant(value):
+    """return value. functools.partial(constant, value) is a picklable factory of value"""
+    return value
+
+
+def _signal_transmission(signal):
+    return np.exp(-signal['optical_depth'])
+
+
+def _signal_attenuation(signal):
+    return -np.expm1(-signal['optical_depth'])
 
 
 def set_distance_units(value=np.NaN, from_units='mm', to_units='cm'):
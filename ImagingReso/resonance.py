@@ -1,6 +1,7 @@
+import copy
+import functools
 import numpy as np
 import numbers
-import os
 import matplotlib.pyplot as plt
 import json
 
@@ -15,16 +16,25 @@ class Resonance(object):
 
     stack = {}  # compound, thickness, atomic_ratio of each layer with isotopes information
     stack_sigma = {}  # all the energy and sigma of the isotopes and compounds
-    stack_signal = {}  # transmission and attenuation signal for every isotope and compound
-    total_signal = {}  # transmission and attenuation of the entire sample
+    total_signal = {}  # optical depth, transmission and attenuation of the entire sample
+    energy_eV = None  # energy axis (read-only) shared by stack_sigma, stack_signal and total_signal
 
     density_lock = {}  # dictionary that will defined the densities locked
 
     energy_max = np.NaN
     energy_min = np.NaN
     energy_step = np.NaN
+    grid = 'linear'  # 'linear' or 'log' energy axis
+    points_per_decade = np.NaN  # number of points per decade of the 'log' energy axis
+    energy = None  # energy axis provided by the user
+    tolerance = np.NaN  # maximum relative error of the interpolated sigma of the 'adaptive' energy axis
 
-    def __init__(self, stack={}, energy_max=1, energy_min=0.001, energy_step=0.001):
+    dtype = np.float64  # type of the sigma, transmission and attenuation arrays
+    max_workers = None  # maximum number of threads loading the isotope files
+
+    def __init__(self, stack={}, energy_max=1, energy_min=0.001, energy_step=0.001, dtype=np.float64,
+                 database='ENDF_VIII', grid='linear', points_per_decade=100, energy=None, tolerance=1e-3,
+                 max_workers=None):
         """initialize resonance object
         
         Paramters:
@@ -42,8 +52,43 @@ class Resonance(object):
         energy_max: float (default 300) max energy in eV to use in calculation
         energy_min: float (default 0) min energy in eV to use in calculation
         energy_step: float (default 0.1) energy step to use in extrapolation of sigma data
+        dtype: numpy type (default np.float64) of the sigma, transmission and attenuation arrays.
+          np.float32 halves the memory used (relative precision ~1e-7)
+        database: string (default 'ENDF_VIII'). Name of the database (folder in reference_data), full path
+          of a folder of isotope csv files, of a zip archive of csv files or of a compiled database
+          (see imagingreso-pack-database). A _database.DatabaseBackend object can also be used
+        grid: string (default 'linear'). 'linear' -> energy axis with a constant energy_step
+                                         'log' -> energy axis with points_per_decade points per decade
+                                         'adaptive' -> energy axis dense around the resonances and sparse
+                                           elsewhere, such that the interpolated sigma of every isotope of
+                                           the stack is within tolerance of the database
+                                         'native' -> union of the energies of the database of every isotope
+                                           of the stack (exact sigma, no interpolation error)
+        points_per_decade: int (default 100) number of points per decade of energy of the 'log' grid
+        tolerance: float (default 1e-3) maximum relative error of the sigma of the 'adaptive' grid
+        energy: array (default None) energy axis (eV) sorted in ascending order. If provided, energy_min,
+          energy_max, energy_step and grid are ignored
+        max_workers: int (default None) maximum number of threads loading the isotope files
+          (None -> default of concurrent.futures.ThreadPoolExecutor, 1 -> files loaded one after the other)
         """
         self.__element_metadata = {}
+        self.__sigma_isotopes = {}  # unweighted (isotopes x energies) sigma and rows of the elements of every compound
+        self.__optical_depth = {}  # optical depth of every compound
+        self.__total_optical_depth = 0.
+        self.__stack_signal = None  # built on request from the optical depths (see stack_signal)
+        self.database = database
+
+        if np.dtype(dtype) not in (np.dtype(np.float64), np.dtype(np.float32)):
+            raise ValueError("dtype {} not supported [np.float64, np.float32]!".format(dtype))
+        self.dtype = np.dtype(dtype).type
+
+        if grid not in ('linear', 'log', 'adaptive', 'native'):
+            raise ValueError("grid {} not supported ['linear', 'log', 'adaptive', 'native']!".format(grid))
+        self.grid = grid
+
+        if energy is not None:
+            self.energy = _utilities.get_energy_axis(energy=energy)
+            energy_min, energy_max = self.energy[0], self.energy[-1]
 
         if energy_min < self.E_MIN:
             raise ValueError("Energy min (eV) must be >= {}".format(self.E_MIN))
@@ -56,14 +101,26 @@ class Resonance(object):
         if energy_min == energy_max:
             raise ValueError("Energy min and max should not have the same value!")
 
-        if (energy_max - energy_min) < energy_step:
+        if energy is None and grid == 'linear' and (energy_max - energy_min) < energy_step:
             raise ValueError("Energy step is bigger than range of energy specified!")
 
+        if energy is None and grid == 'log' and not points_per_decade > 0:
+            raise ValueError("Number of points per decade must be > 0!")
+
+        if energy is None and grid == 'adaptive' and not tolerance > 0:
+            raise ValueError("Tolerance must be > 0!")
+
+        if max_workers is not None and not max_workers > 0:
+            raise ValueError("Number of workers must be > 0!")
+
         self.energy_step = energy_step
+        self.points_per_decade = points_per_decade
+        self.tolerance = tolerance
+        self.max_workers = max_workers
 
         if not stack == {}:
             # checking that every element of each stack is defined
-            _utilities.checking_stack(stack=stack)
+            _utilities.checking_stack(stack=stack, database=self.database)
             new_stack = self.__update_stack_with_isotopes_infos(stack=stack)
             self.stack = new_stack
 
@@ -111,10 +168,17 @@ class Resonance(object):
         self.__lock_density_if_defined(stack=_new_stack)
 
         new_stack = self.__update_stack_with_isotopes_infos(stack=_new_stack)
+        # only the new layer is calculated, unless it replaces a layer or the energy axis depends on the isotopes
+        _incremental = (self.stack != {}) and (self.total_signal != {}) and \
+                       (self.energy is not None or self.grid in ('linear', 'log')) and \
+                       not (set(new_stack.keys()) & set(self.stack.keys()))
         self.stack = {**self.stack, **new_stack}
 
         # calculate stack_sigma, layer density, atoms_per_cm3 ...
-        self.__math_on_stack()
+        if _incremental:
+            self.__math_on_stack(compounds=list(new_stack.keys()))
+        else:
+            self.__math_on_stack()
 
     def get_isotopic_ratio(self, compound='', element=''):
         """returns the list of isotopes for the element of the compound defined with their stoichiometric values
@@ -208,8 +272,13 @@ class Resonance(object):
         self.__update_molar_mass(compound=compound, element=element)
         self.__update_density(compound=compound, element=element)
 
-        # update entire stack
-        self.__math_on_stack()
+        # reweight the sigma of the isotopes already loaded and update only this compound
+        _sigma_isotopes = self.__sigma_isotopes[compound]
+        self.__weight_sigmas(stack_sigma=self.stack_sigma,
+                             sigma_isotopes=_sigma_isotopes['sigma_b'][_sigma_isotopes['rows'][element]],
+                             compound=compound, element=element)
+        self.__calculate_atoms_per_cm3(compounds=[compound])
+        self.__calculate_transmission_attenuation(compounds=[compound])
 
     def get_density(self, compound='', element=''):
         """returns the list of isotopes for the element of the compound defined with their density
@@ -299,21 +368,27 @@ class Resonance(object):
         # calculate transmission and attenuation
         self.__calculate_transmission_attenuation()
 
-    def __math_on_stack(self, used_lock=False):
+    def __math_on_stack(self, used_lock=False, compounds=None):
         """will perform all the various update of the stack, such as populating the stack_sigma, caluclate the density of the
-        layers....etc. """
+        layers....etc.
+
+        Parameters:
+        ===========
+        compounds: list (default is None). If provided, only these new layers are calculated and their
+          transmission is multiplied into the signal of the other layers
+        """
 
         # populate stack_sigma (Sigma vs Energy for every element)
-        self.__get_sigmas()
+        self.__get_sigmas(compounds=compounds)
 
         # populate compound density (if none provided)
-        self.__update_layer_density()
+        self.__update_layer_density(compounds=compounds)
 
         # populate atoms_per_cm3
-        self.__calculate_atoms_per_cm3(used_lock=used_lock)
+        self.__calculate_atoms_per_cm3(used_lock=used_lock, compounds=compounds)
 
         # calculate transmission and attenuation
-        self.__calculate_transmission_attenuation()
+        self.__calculate_transmission_attenuation(compounds=compounds)
 
     def __lock_density_if_defined(self, stack={}):
         """lock (True) the density lock if the density has been been defined during initialization
@@ -338,78 +413,509 @@ class Resonance(object):
                 density_lock[_compound] = True
         self.density_lock = density_lock
 
-    def __calculate_transmission_attenuation(self):
-        """  """
+    def __calculate_transmission_attenuation(self, compounds=None):
+        """calculate the optical depth of the compounds and the transmission and attenuation of the stack
+
+        The optical depth of a compound is the product of the areal density of its isotopes by its
+        (isotopes x energies) sigma array. The signal of every isotope, element and compound (stack_signal)
+        is calculated on request.
+
+        Parameters:
+        ===========
+        compounds: list (default is None). If provided, only the optical depth of these compounds is calculated.
+          The optical depth of new compounds is added to the total, otherwise the total optical depth is
+          the sum of the optical depth of all the compounds
+        """
         stack = self.stack
-        stack_sigma = self.stack_sigma
-        stack_signal = {}
 
+        if compounds is None:
+            compounds = stack.keys()
+            _optical_depth = {}
+            _new_compounds = False
+        else:
+            _optical_depth = dict(self.__optical_depth)
+            _new_compounds = not (set(compounds) & set(_optical_depth.keys()))
+
+        for _name_of_compound in compounds:
+            _optical_depth[_name_of_compound] = _utilities.calculate_optical_depth(
+                areal_density=self.__get_areal_density(compound=_name_of_compound),
+                sigma_b=self.__sigma_isotopes[_name_of_compound]['sigma_b'])
+
+        if _new_compounds:
+            _total_optical_depth = self.__total_optical_depth
+            _list_compounds = compounds
+        else:
+            _total_optical_depth = 0.
+            _list_compounds = stack.keys()
+        for _name_of_compound in _list_compounds:
+            _total_optical_depth = _total_optical_depth + _optical_depth[_name_of_compound]
+
+        self.__optical_depth = _optical_depth
+        self.__total_optical_depth = _total_optical_depth
+        self.__stack_signal = None
+
+        # exp is evaluated once, on the optical depth of the entire stack
         total_signal = {}
-        total_transmisison = 1.
+        total_signal['optical_depth'] = _total_optical_depth
+        total_signal['transmission'] = np.exp(-_total_optical_depth)
+        total_signal['attenuation'] = -np.expm1(-_total_optical_depth)
+        total_signal['energy_eV'] = self.energy_eV
+        self.total_signal = total_signal
+
+    def __get_areal_density(self, compound='', thickness_cm=None):
+        """return the number of atoms per barn (thickness_cm * atoms_per_cm3 * 1e-24) of every isotope of the
+        compound, in the order of the rows of its sigma array. thickness_cm defaults to the layer thickness"""
+        _stack = self.stack
+        if thickness_cm is None:
+            _thickness_cm = _utilities.set_distance_units(value=_stack[compound]['thickness']['value'],
+                                                          from_units=_stack[compound]['thickness']['units'],
+                                                          to_units='cm')
+        else:
+            _thickness_cm = thickness_cm
+        _areal_density = []
+        for _element in _stack[compound]['elements']:
+            _atoms_per_cm3 = _stack[compound]['atoms_per_cm3'][_element]
+            for _ratio in _stack[compound][_element]['isotopes']['isotopic_ratio']:
+                _areal_density.append(_thickness_cm * 1e-24 * _atoms_per_cm3 * _ratio)
+        return np.array(_areal_density, dtype=self.dtype)
+
+    def transmission_vs_thickness(self, compound='', thicknesses=[], total=False):
+        """return the transmission of the compound for each thickness, without recalculating the stack
+
+        The optical depth of the compound is proportional to its thickness, so the optical depth of 1 cm of
+        the compound is calculated once and scaled by every thickness.
+
+        Parameters:
+        ===========
+        compound: string (default is ''). Name of compound
+        thicknesses: list or np.array of thicknesses (in mm)
+        total: boolean (default is False). If True, returns the transmission of the entire stack where only
+          the thickness of the compound changes
+
+        Returns:
+        ========
+        np.array (thicknesses x energies) of transmission, on the energy axis self.energy_eV
+
+        Raises:
+        =======
+        ValueError if compound does not exist
+        ValueError if thicknesses is not a 1D array of positive values
+        """
+        _stack = self.stack
+        list_compounds = _stack.keys()
+        if not compound in list_compounds:
+            list_compounds_joined = ', '.join(list_compounds)
+            raise ValueError("Compound '{}' could not be find in {}".format(compound, list_compounds_joined))
+
+        _thicknesses = np.asarray(thicknesses, dtype=np.float64)
+        if _thicknesses.ndim != 1:
+            raise ValueError("thicknesses must be a 1D array!")
+        if np.any(_thicknesses < 0):
+            raise ValueError("thicknesses must be positive!")
+        _thicknesses_cm = _utilities.set_distance_units(value=_thicknesses, from_units='mm', to_units='cm')
+
+        _optical_depth_per_cm = _utilities.calculate_optical_depth(
+            areal_density=self.__get_areal_density(compound=compound, thickness_cm=1.),
+            sigma_b=self.__sigma_isotopes[compound]['sigma_b'])
+        _optical_depth = _thicknesses_cm.astype(_optical_depth_per_cm.dtype)[:, np.newaxis] * \
+                         _optical_depth_per_cm[np.newaxis, :]
+
+        if total:
+            _other_compounds = [_compound for _compound in list_compounds if _compound != compound]
+            for _other_compound in _other_compounds:
+                _optical_depth += self.__optical_depth[_other_compound]
+
+        return np.exp(-_optical_depth)
+
+    @classmethod
+    def batch_transmission(cls, stacks=[], energy_max=1, energy_min=0.001, energy_step=0.001, dtype=np.float64,
+                           database='ENDF_VIII', grid='linear', points_per_decade=100, energy=None, tolerance=1e-3,
+                           max_workers=None):
+        """return the transmission of many samples over the same energy axis, loading each isotope only once
+
+        The sigma of all the distinct isotopes of the samples are interpolated in one array. The areal density
+        of the isotopes of every sample are gathered in a (samples x isotopes) array, so the optical depth of
+        all the samples is a single product of the two arrays.
+
+        Parameters:
+        ===========
+        stacks: list of stack dictionaries (see __init__), one per sample
+        energy_max, energy_min, energy_step, dtype, database, grid, points_per_decade, energy, tolerance,
+          max_workers: see __init__. With grid='adaptive' or 'native', the energy axis is built from the isotopes
+          of all the samples
+
+        Returns:
+        ========
+        {'energy_eV': np.array, 'transmission': np.array of shape (number of samples, number of energies)}
+
+        Raises:
+        =======
+        ValueError if stacks is empty
+        """
+        if len(stacks) == 0:
+            raise ValueError("At least one stack must be provided!")
+
+        _kwargs = {'energy_max': energy_max, 'energy_min': energy_min, 'energy_step': energy_step,
+                   'dtype': dtype, 'database': database, 'grid': grid, 'points_per_decade': points_per_decade,
+                   'energy': energy, 'tolerance': tolerance, 'max_workers': max_workers}
+
+        _list_samples = [cls.__prepare_sample(stack=_stack, kwargs=_kwargs) for _stack in stacks]
+        _list_file_names = []
+        for _o_sample in _list_samples:
+            for _file in _o_sample.__get_file_names():
+                if _file not in _list_file_names:
+                    _list_file_names.append(_file)
+
+        _o_reso = _list_samples[0]
+        _energy_axis = _o_reso.energy
+        if _energy_axis is None and _o_reso.grid in ('adaptive', 'native'):
+            _energy_axis = _o_reso.__get_stack_energy_axis(file_names=_list_file_names)
+        _dict = _utilities.get_sigmas(database_file_names=_list_file_names,
+                                      E_min=_o_reso.energy_min,
+                                      E_max=_o_reso.energy_max,
+                                      E_step=_o_reso.energy_step,
+                                      dtype=_o_reso.dtype,
+                                      database=_o_reso.database,
+                                      grid=_o_reso.grid,
+                                      points_per_decade=_o_reso.points_per_decade,
+                                      energy=_energy_axis,
+                                      max_workers=_o_reso.max_workers)
+
+        _areal_density = np.stack([_o_sample.__get_areal_density_of_files(file_names=_list_file_names)
+                                   for _o_sample in _list_samples])
+
+        _optical_depth = _utilities.calculate_optical_depth(areal_density=_areal_density, sigma_b=_dict['sigma_b'])
+        return {'energy_eV': _dict['energy_eV'],
+                'transmission': np.exp(-_optical_depth)}
+
+    @classmethod
+    def stream_transmission(cls, stack={}, chunk_size=100000, energy_max=1, energy_min=0.001, energy_step=0.001,
+                            dtype=np.float64, database='ENDF_VIII', grid='linear', points_per_decade=100,
+                            energy=None, tolerance=1e-3):
+        """yield the transmission of the stack by chunks of the energy axis
+
+        Only the rows of the database bracketing the current chunk are loaded and interpolated, so the memory
+        used depends on chunk_size and not on the size of the energy axis. The chunks put end to end are the
+        energy axis and transmission of Resonance(stack=stack, ...).
+
+        Parameters:
+        ===========
+        stack: dictionary (see __init__)
+        chunk_size: int (default 100000) maximum number of energies of each chunk
+        energy_max, energy_min, energy_step, dtype, database, grid, points_per_decade, energy, tolerance:
+          see __init__
+
+        Returns:
+        ========
+        generator of (energy_chunk, transmission_chunk) np.array
+
+        Raises:
+        =======
+        ValueError if stack is empty
+        ValueError if chunk_size is not > 0
+        """
+        if stack == {}:
+            raise ValueError("Stack must not be empty!")
+        if not chunk_size > 0:
+            raise ValueError("Chunk size must be > 0!")
+
+        _kwargs = {'energy_max': energy_max, 'energy_min': energy_min, 'energy_step': energy_step,
+                   'dtype': dtype, 'database': database, 'grid': grid, 'points_per_decade': points_per_decade,
+                   'energy': energy, 'tolerance': tolerance}
+        _o_reso = cls.__prepare_sample(stack=stack, kwargs=_kwargs)
+        _list_file_names = _o_reso.__get_file_names()
+        _areal_density = _o_reso.__get_areal_density_of_files(file_names=_list_file_names)
+
+        _energy_axis = _o_reso.energy
+        if _energy_axis is None and _o_reso.grid in ('adaptive', 'native'):
+            _energy_axis = _o_reso.__get_stack_energy_axis()
+        if _energy_axis is None:
+            _chunks = _utilities.get_energy_grid_chunks(E_min=_o_reso.energy_min, E_max=_o_reso.energy_max,
+                                                        E_step=_o_reso.energy_step, grid=_o_reso.grid,
+                                                        points_per_decade=_o_reso.points_per_decade,
+                                                        chunk_size=chunk_size)
+        else:
+            _chunks = (_energy_axis[_index:_index + chunk_size] for _index in range(0, len(_energy_axis), chunk_size))
+
+        for _energy in _chunks:
+            _tables = [_utilities._get_database_table(file_name=_file, E_min=_energy[0], E_max=_energy[-1],
+                                                      database=_o_reso.database)
+                       for _file in _list_file_names]
+            _sigma_b = _utilities.interpolate_tables(tables=_tables, energy=_energy, dtype=_o_reso.dtype)
+            _optical_depth = _utilities.calculate_optical_depth(areal_density=_areal_density, sigma_b=_sigma_b)
+            yield _energy.astype(_o_reso.dtype), np.exp(-_optical_depth)
+
+    @classmethod
+    def __prepare_sample(cls, stack={}, kwargs={}):
+        """return a Resonance object of the stack with its density and atoms_per_cm3, without loading any sigma
+
+        Parameters:
+        ===========
+        stack: dictionary (see __init__)
+        kwargs: dictionary of the other arguments of __init__
+        """
+        _o_sample = cls(**kwargs)
+        _utilities.checking_stack(stack=stack, database=_o_sample.database)
+        _o_sample.stack = _o_sample.__update_stack_with_isotopes_infos(stack=copy.deepcopy(stack))
+        _o_sample.density_lock = {}
+        _o_sample.__lock_density_if_defined(stack=_o_sample.stack)
+        _o_sample.__update_layer_density()
+        _o_sample.__calculate_atoms_per_cm3()
+        return _o_sample
+
+    def __get_areal_density_of_files(self, file_names=[]):
+        """return the number of atoms per barn of the stack for each of the database file_names
+        (0 for the files that are not in the stack)"""
+        _rows = {_file: _row for _row, _file in enumerate(file_names)}
+        _areal_density = np.zeros(len(file_names), dtype=self.dtype)
+        for _compound in self.stack.keys():
+            _file_names = []
+            for _element in self.stack[_compound]['elements']:
+                _file_names += self.stack[_compound][_element]['isotopes']['file_names']
+            np.add.at(_areal_density, [_rows[_file] for _file in _file_names],
+                      self.__get_areal_density(compound=_compound))
+        return _areal_density
+
+    def sweep(self, parameters={}, total=False, processes=None, chunk_size=256):
+        """return the transmission of many variants of the layers, without recalculating the stack
+
+        Each variant uses the sigma of the isotopes already loaded. The parameters that are not swept keep the
+        values of the stack, and the density of a layer follows its stoichiometric and isotopic ratios unless
+        it is swept or has been defined.
+
+        Parameters:
+        ===========
+        parameters: dictionary of the swept parameters of each compound, all with the same number of variants
+          ex: {'CoAg': {'thickness': [0.025, 0.05],  # mm
+                        'density': [8.9, 9.1],  # g/cm3
+                        'stoichiometric_ratio': [[1, 1], [1, 2]],  # variants x elements
+                        'isotopic_ratio': {'Ag': [[0.5, 0.5], [0.4, 0.6]]}}}  # variants x isotopes
+        total: boolean (default is False). If True, returns the transmission of the entire stack where only
+          the swept compounds change
+        processes: int (default is None). If provided, the variants are calculated by this number of processes
+          sharing the sigma array (see _utilities.calculate_sweep_transmission)
+        chunk_size: int (default is 256). Number of variants calculated at once
+
+        Returns:
+        ========
+        np.array (variants x energies) of transmission, on the energy axis self.energy_eV
+
+        Raises:
+        =======
+        ValueError if a compound, element or parameter does not exist
+        ValueError if the parameters do not have the right format or number of variants
+        ValueError if processes or chunk_size is not > 0
+        """
+        _n_variants = self.__get_number_of_variants(parameters=parameters)
+
+        # the isotopes of all the swept compounds are calculated in one (variants x isotopes) array
+        _list_areal_density = []
+        _list_sigma_b = []
+        for _compound in parameters.keys():
+            _list_areal_density.append(self.__get_sweep_areal_density(compound=_compound,
+                                                                      parameters=parameters[_compound],
+                                                                      n_variants=_n_variants))
+            _list_sigma_b.append(self.__sigma_isotopes[_compound]['sigma_b'])
+
+        if len(_list_sigma_b) == 1:
+            _areal_density, _sigma_b = _list_areal_density[0], _list_sigma_b[0]
+        else:
+            _areal_density = np.concatenate(_list_areal_density, axis=1)
+            _sigma_b = np.concatenate(_list_sigma_b, axis=0)
+
+        _optical_depth = 0.
+        if total:
+            for _compound in self.stack.keys():
+                if not _compound in parameters.keys():
+                    _optical_depth = _optical_depth + self.__optical_depth[_compound]
+
+        return _utilities.calculate_sweep_transmission(areal_density=_areal_density,
+                                                       sigma_b=_sigma_b,
+                                                       optical_depth=_optical_depth,
+                                                       processes=processes,
+                                                       chunk_size=chunk_size)
+
+    def __get_number_of_variants(self, parameters={}):
+        """check the compounds, elements and parameters of a sweep and return its number of variants"""
+        _stack = self.stack
+        _list_parameters = ['thickness', 'density', 'stoichiometric_ratio', 'isotopic_ratio']
+
+        _list_n_variants = []
+        for _compound in parameters.keys():
+            if not _compound in _stack.keys():
+                list_compounds_joined = ', '.join(_stack.keys())
+                raise ValueError("Compound '{}' could not be find in {}".format(_compound, list_compounds_joined))
+            for _parameter in parameters[_compound].keys():
+                if not _parameter in _list_parameters:
+                    raise ValueError("Parameter '{}' should be any of {}".format(_parameter,
+                                                                                ', '.join(_list_parameters)))
+            _parameters = parameters[_compound]
+            _list_elements = _stack[_compound]['elements']
+
+            for _parameter in ['thickness', 'density']:
+                if _parameter in _parameters.keys():
+                    _values = np.asarray(_parameters[_parameter])
+                    if _values.ndim != 1:
+                        raise ValueError("{} of '{}' must be a 1D array!".format(_parameter, _compound))
+                    _list_n_variants.append(len(_values))
+
+            if 'stoichiometric_ratio' in _parameters.keys():
+                _values = np.asarray(_parameters['stoichiometric_ratio'])
+                if not (_values.ndim == 2 and _values.shape[1] == len(_list_elements)):
+                    raise ValueError("stoichiometric_ratio of '{}' must be a (variants x {} elements) array!".format(
+                        _compound, len(_list_elements)))
+                _list_n_variants.append(len(_values))
+
+            for _element in _parameters.get('isotopic_ratio', {}).keys():
+                if not _element in _list_elements:
+                    list_element_joined = ', '.join(_list_elements)
+                    raise ValueError("Element '{}' should be any of those elements: {}".format(_element,
+                                                                                               list_element_joined))
+                _values = np.asarray(_parameters['isotopic_ratio'][_element])
+                _n_isotopes = len(_stack[_compound][_element]['isotopes']['list'])
+                if not (_values.ndim == 2 and _values.shape[1] == _n_isotopes):
+                    raise ValueError("isotopic_ratio of '{}' must be a (variants x {} isotopes) array!".format(
+                        _element, _n_isotopes))
+                _list_n_variants.append(len(_values))
+
+        if _list_n_variants == []:
+            raise ValueError("At least one parameter must be swept!")
+        if len(set(_list_n_variants)) != 1:
+            raise ValueError("All the parameters must have the same number of variants!")
+        if _list_n_variants[0] == 0:
+            raise ValueError("At least one variant must be provided!")
+        return _list_n_variants[0]
+
+    def __get_sweep_areal_density(self, compound='', parameters={}, n_variants=1):
+        """return the (variants x isotopes) number of atoms per barn of the compound for the swept parameters,
+        the other parameters keeping their values of the stack"""
+        _stack = self.stack
+        _compound_dict = _stack[compound]
+        _list_elements = _compound_dict['elements']
+        _isotopic_ratio_swept = parameters.get('isotopic_ratio', {})
+
+        _list_isotopic_ratio = []
+        _list_molar_mass = []
+        _list_density = []
+        for _element in _list_elements:
+            _isotopes = _compound_dict[_element]['isotopes']
+            if _element in _isotopic_ratio_swept.keys():
+                # same molar mass and density as set_isotopic_ratio
+                _isotopic_ratio = np.asarray(_isotopic_ratio_swept[_element], dtype=np.float64)
+                _molar_mass = 0
+                _density = 0
+                for _index in range(len(_isotopes['list'])):
+                    _molar_mass = _molar_mass + _isotopic_ratio[:, _index] * float(_isotopes['mass']['value'][_index])
+                    _density = _density + _isotopic_ratio[:, _index] * float(_isotopes['density']['value'][_index])
+            else:
+                _isotopic_ratio = np.tile(np.asarray(_isotopes['isotopic_ratio'], dtype=np.float64),
+                                          (n_variants, 1))
+                _molar_mass = np.full(n_variants, _compound_dict[_element]['molar_mass']['value'], dtype=np.float64)
+                _density = np.full(n_variants, _compound_dict[_element]['density']['value'], dtype=np.float64)
+            _list_isotopic_ratio.append(_isotopic_ratio)
+            _list_molar_mass.append(_molar_mass)
+            _list_density.append(_density)
+
+        if 'stoichiometric_ratio' in parameters.keys():
+            _stoichiometric_ratio = np.asarray(parameters['stoichiometric_ratio'], dtype=np.float64)
+        else:
+            _stoichiometric_ratio = np.tile(np.asarray(_compound_dict['stoichiometric_ratio'], dtype=np.float64),
+                                            (n_variants, 1))
+
+        if 'density' in parameters.keys():
+            _layer_density = np.asarray(parameters['density'], dtype=np.float64)
+        elif self.density_lock[compound]:
+            _layer_density = np.full(n_variants, _compound_dict['density']['value'], dtype=np.float64)
+        else:
+            # same layer density as __update_layer_density
+            _sum_ratio = _stoichiometric_ratio.sum(axis=1)
+            _layer_density = 0
+            for _index in range(len(_list_elements)):
+                _layer_density = _layer_density + (_stoichiometric_ratio[:, _index] * _list_density[_index]) / \
+                                                  _sum_ratio
+
+        if 'thickness' in parameters.keys():
+            _thickness_cm = _utilities.set_distance_units(value=np.asarray(parameters['thickness'], dtype=np.float64),
+                                                          from_units='mm', to_units='cm')
+        else:
+            _thickness_cm = np.full(n_variants, _utilities.set_distance_units(
+                value=_compound_dict['thickness']['value'],
+                from_units=_compound_dict['thickness']['units'],
+                to_units='cm'), dtype=np.float64)
+
+        _areal_density = _utilities.get_areal_density_of_layer(thickness_cm=_thickness_cm,
+                                                               density=_layer_density,
+                                                               stoichiometric_ratio=_stoichiometric_ratio,
+                                                               molar_mass=np.stack(_list_molar_mass, axis=1),
+                                                               isotopic_ratio=_list_isotopic_ratio)
+        return _areal_density.astype(self.dtype)
+
+    @property
+    def stack_signal(self):
+        """optical depth, transmission and attenuation signal for every isotope, element and compound
+
+        Each entry is calculated the first time it is accessed, and kept until the stack changes.
+        """
+        if self.__stack_signal is None:
+            self.__stack_signal = self.__build_stack_signal()
+        return self.__stack_signal
+
+    def __build_stack_signal(self):
+        """return the stack_signal (see _utilities.LazyDict) of the current stack. Only references to the
+        current sigma and optical depths are kept, no array is calculated until it is accessed"""
+        stack = self.stack
+        stack_sigma = self.stack_sigma
+        _energy = self.energy_eV
 
         # compound level
+        _compounds = {}
         for _name_of_compound in stack.keys():
-            stack_signal[_name_of_compound] = {}
-            transmission_compound = 1.
-            energy_compound = []
-
-            _list_element = stack[_name_of_compound]['elements']
             _thickness_cm = _utilities.set_distance_units(value=stack[_name_of_compound]['thickness']['value'],
                                                           from_units=stack[_name_of_compound]['thickness']['units'],
                                                           to_units='cm')
 
             # element level
-            for _element in _list_element:
-                stack_signal[_name_of_compound][_element] = {}
+            _elements = {}
+            for _element in stack[_name_of_compound]['elements']:
                 _atoms_per_cm3 = stack[_name_of_compound]['atoms_per_cm3'][_element]
+                _sigma_element = stack_sigma[_name_of_compound][_element]
+
+                _areal_density = _thickness_cm * 1e-24 * _atoms_per_cm3
 
                 # isotope level
+                _isotopes = {}
                 for _iso in stack[_name_of_compound][_element]['isotopes']['list']:
-                    stack_signal[_name_of_compound][_element][_iso] = {}
-                    _sigma_iso = stack_sigma[_name_of_compound][_element][_iso]['sigma_b']
-                    _transmission_iso = _utilities.calculate_transmission(
-                        thickness_cm=_thickness_cm,
-                        atoms_per_cm3=_atoms_per_cm3,
-                        sigma_b=_sigma_iso)
-                    stack_signal[_name_of_compound][_element][_iso]['transmission'] = _transmission_iso
-                    stack_signal[_name_of_compound][_element][_iso]['attenuation'] = 1. - _transmission_iso
-                    stack_signal[_name_of_compound][_element][_iso]['energy_eV'] = \
-                        stack_sigma[_name_of_compound][_element][_iso]['energy_eV']
-
-                _sigma_ele = stack_sigma[_name_of_compound][_element]['sigma_b']
-                _transmission_ele = _utilities.calculate_transmission(
-                    thickness_cm=_thickness_cm,
-                    atoms_per_cm3=_atoms_per_cm3,
-                    sigma_b=_sigma_ele)
-                stack_signal[_name_of_compound][_element]['transmission'] = _transmission_ele
-                stack_signal[_name_of_compound][_element]['attenuation'] = 1. - _transmission_ele
-                stack_signal[_name_of_compound][_element]['energy_eV'] = stack_sigma[_name_of_compound][_element][
-                    'energy_eV']
-
-                transmission_compound *= _transmission_ele
-                if energy_compound == []:
-                    energy_compound = stack_sigma[_name_of_compound][_element]['energy_eV']
-
-            stack_signal[_name_of_compound]['transmission'] = transmission_compound
-            stack_signal[_name_of_compound]['attenuation'] = 1. - transmission_compound
-            stack_signal[_name_of_compound]['energy_eV'] = energy_compound
-
-            total_transmisison *= transmission_compound
-
-        total_attenuation = 1. - total_transmisison
-
-        self.stack_signal = stack_signal
-        total_signal['transmission'] = total_transmisison
-        total_signal['attenuation'] = total_attenuation
-        total_signal['energy_eV'] = energy_compound
-        self.total_signal = total_signal
-
-    def __calculate_atoms_per_cm3(self, used_lock=False):
+                    _optical_depth_iso = functools.partial(_utilities.calculate_optical_depth,
+                                                           areal_density=_areal_density,
+                                                           sigma_b=_sigma_element[_iso]['sigma_b'])
+                    _isotopes[_iso] = functools.partial(_utilities.lazy_signal,
+                                                        optical_depth=_optical_depth_iso,
+                                                        energy_eV=_energy)
+
+                _optical_depth_ele = functools.partial(_utilities.calculate_optical_depth,
+                                                       areal_density=_areal_density,
+                                                       sigma_b=_sigma_element['sigma_b'])
+                _elements[_element] = functools.partial(_utilities.lazy_signal,
+                                                        optical_depth=_optical_depth_ele,
+                                                        energy_eV=_energy,
+                                                        children=_isotopes)
+
+            _optical_depth = functools.partial(_utilities.constant, self.__optical_depth[_name_of_compound])
+            _compounds[_name_of_compound] = functools.partial(_utilities.lazy_signal,
+                                                              optical_depth=_optical_depth,
+                                                              energy_eV=_energy,
+                                                              children=_elements)
+
+        return _utilities.LazyDict(factories=_compounds)
+
+    def __calculate_atoms_per_cm3(self, used_lock=False, compounds=None):
         """calculate for each element, the atoms per cm3"""
         stack = self.stack
         _density_lock = self.density_lock
 
-        for _name_of_compound in stack.keys():
+        if compounds is None:
+            compounds = stack.keys()
+        for _name_of_compound in compounds:
             if used_lock and _density_lock[_name_of_compound]:
                 continue
             atoms_per_cm3 = _utilities.get_atoms_per_cm3_of_layer(compound_dict=stack[_name_of_compound])
@@ -431,13 +937,13 @@ class Resonance(object):
 
         return stack
 
-    def __update_layer_density(self, debug=False):
+    def __update_layer_density(self, debug=False, compounds=None):
         """calculate or update the layer density"""
         _stack = self.stack
 
         _density_lock = self.density_lock
 
-        list_compound = _stack.keys()
+        list_compound = _stack.keys() if compounds is None else compounds
         for _key in list_compound:
             if _density_lock[_key]:
                 continue
@@ -503,55 +1009,142 @@ class Resonance(object):
             _molar_mass_element += np.float(_ratio) * np.float(_mass)
         self.stack[compound][element]['molar_mass']['value'] = _molar_mass_element
 
-    def __get_sigmas(self):
+    def __get_file_names(self):
+        """return the database file names of all the isotopes of the stack, without duplicates"""
+        _list_file_names = []
+        for _compound in self.stack.keys():
+            for _element in self.stack[_compound]['elements']:
+                for _file in self.stack[_compound][_element]['isotopes']['file_names']:
+                    if _file not in _list_file_names:
+                        _list_file_names.append(_file)
+        return _list_file_names
+
+    def __get_stack_energy_axis(self, file_names=None):
+        """return the energy axis built from all the isotopes of the stack (see grid='adaptive' and 'native')
+
+        Parameters:
+        ===========
+        file_names: list (default is None). If provided, database files of the isotopes to use instead
+        """
+        if file_names is None:
+            file_names = self.__get_file_names()
+        _tables = [_utilities._get_database_table(file_name=_file, E_min=self.energy_min, E_max=self.energy_max,
+                                                  database=self.database)
+                   for _file in file_names]
+        if self.grid == 'native':
+            return _utilities.get_native_energy_axis(tables=_tables, E_min=self.energy_min, E_max=self.energy_max)
+        return _utilities.get_adaptive_energy_axis(tables=_tables, E_min=self.energy_min, E_max=self.energy_max,
+                                                   tolerance=self.tolerance)
+
+    def __get_sigmas(self, compounds=None):
         """will populate the stack_sigma dictionary with the energy and sigma array
-        for all the compound/element and isotopes"""
-        stack_sigma = {}
+        for all the compound/element and isotopes
+
+        Parameters:
+        ===========
+        compounds: list (default is None). If provided, only the sigma of these compounds are loaded
+        """
         _stack = self.stack
+        if compounds is None:
+            stack_sigma = {}
+            _sigma_isotopes = {}
+            _list_compounds = _stack.keys()
+        else:
+            stack_sigma = dict(self.stack_sigma)
+            _sigma_isotopes = dict(self.__sigma_isotopes)
+            _list_compounds = compounds
+
+        _energy_axis = self.energy
+        if _energy_axis is None and self.grid in ('adaptive', 'native'):
+            # union axis of all the isotopes of the stack, shared by all the layers
+            _energy_axis = self.__get_stack_energy_axis()
+
+        # single energy axis referenced by every isotope, element and compound
+        if compounds is not None:
+            _energy = self.energy_eV
+        elif _energy_axis is None:
+            _energy = _utilities.get_energy_grid(E_min=self.energy_min, E_max=self.energy_max,
+                                                 E_step=self.energy_step, dtype=self.dtype, grid=self.grid,
+                                                 points_per_decade=self.points_per_decade)
+        else:
+            _energy = _energy_axis.astype(self.dtype)
+            _energy.flags.writeable = False
+        self.energy_eV = _energy
 
-        _file_path = os.path.abspath(os.path.dirname(__file__))
-        _database_folder = os.path.join(_file_path, 'reference_data', self.database)
+        # the distinct isotopes of the compounds are loaded at once, concurrently
+        _list_file_names = []
+        for _compound in _list_compounds:
+            for _element in _stack[_compound]['elements']:
+                for _file in _stack[_compound][_element]['isotopes']['file_names']:
+                    if _file not in _list_file_names:
+                        _list_file_names.append(_file)
+        _dict = _utilities.get_sigmas(database_file_names=_list_file_names,
+                                      E_min=self.energy_min,
+                                      E_max=self.energy_max,
+                                      E_step=self.energy_step,
+                                      dtype=self.dtype,
+                                      database=self.database,
+                                      grid=self.grid,
+                                      points_per_decade=self.points_per_decade,
+                                      energy=_energy_axis,
+                                      max_workers=self.max_workers)
+        _file_rows = {_file: _row for _row, _file in enumerate(_list_file_names)}
 
-        _list_compounds = _stack.keys()
         for _compound in _list_compounds:
             _list_element = _stack[_compound]['elements']
             stack_sigma[_compound] = {}
 
+            # all the isotopes of the compound share the same (isotopes x energies) array
+            _compound_file_names = []
+            _rows = {}
+            for _element in _list_element:
+                _element_file_names = _stack[_compound][_element]['isotopes']['file_names']
+                _rows[_element] = slice(len(_compound_file_names), len(_compound_file_names) + len(_element_file_names))
+                _compound_file_names += _element_file_names
+            if _compound_file_names == _list_file_names:
+                _sigma_b = _dict['sigma_b']
+            else:
+                _sigma_b = _dict['sigma_b'][[_file_rows[_file] for _file in _compound_file_names]]
+                _sigma_b.flags.writeable = False
+            _sigma_isotopes[_compound] = {'sigma_b': _sigma_b,
+                                          'rows': _rows}
+
             for _element in _list_element:
-                stack_sigma[_compound][_element] = {}
-                _list_isotopes = _stack[_compound][_element]['isotopes']['list']
-                _list_file_names = _stack[_compound][_element]['isotopes']['file_names']
-                _list_isotopic_ratio = _stack[_compound][_element]['isotopes']['isotopic_ratio']
-                _iso_file_ratio = zip(_list_isotopes, _list_file_names, _list_isotopic_ratio)
-
-                # _dict_sigma_isotopes_sum = {}
-                _sigma_all_isotopes = 0
-                _energy_all_isotpes = 0
-
-                for _iso, _file, _ratio in _iso_file_ratio:
-                    stack_sigma[_compound][_element][_iso] = {}
-                    _file = os.path.join(_database_folder, _file)
-                    _dict = _utilities.get_sigma(database_file_name=_file,
-                                                 E_min=self.energy_min,
-                                                 E_max=self.energy_max,
-                                                 E_step=self.energy_step)
-                    stack_sigma[_compound][_element][_iso]['energy_eV'] = _dict['energy_eV']
-                    stack_sigma[_compound][_element][_iso]['sigma_b'] = _dict['sigma_b'] * _ratio
-
-                    # sigma for all isotopes with their isotopic ratio
-                    _sigma_all_isotopes += _dict['sigma_b'] * _ratio
-                    _energy_all_isotpes += _dict['energy_eV']
-
-                # energy axis (x-axis) is averaged to take into account differences between x-axis of isotopes
-                _mean_energy_all_isotopes = _energy_all_isotpes / len(_list_isotopes)
-                stack_sigma[_compound][_element]['energy_eV'] = _mean_energy_all_isotopes
-                stack_sigma[_compound][_element]['sigma_b'] = _sigma_all_isotopes
+                self.__weight_sigmas(stack_sigma=stack_sigma, sigma_isotopes=_sigma_b[_rows[_element]],
+                                     compound=_compound, element=_element)
 
         self.stack_sigma = stack_sigma
+        self.__sigma_isotopes = _sigma_isotopes
+
+    def __weight_sigmas(self, stack_sigma={}, sigma_isotopes=[], compound='', element=''):
+        """fill the stack_sigma of the compound/element with the sigma of its isotopes weighted by their
+        isotopic ratio, and their sum
+
+        Parameters:
+        ===========
+        stack_sigma: dictionary to fill
+        sigma_isotopes: (isotopes x energies) array of the unweighted sigma of the isotopes
+        compound: string (default is '') name of compound
+        element: string (default is '') name of element
+        """
+        _list_isotopes = self.stack[compound][element]['isotopes']['list']
+        _list_isotopic_ratio = self.stack[compound][element]['isotopes']['isotopic_ratio']
+        _ratio = np.asarray(_list_isotopic_ratio, dtype=sigma_isotopes.dtype)
+        _sigma_isotopes = sigma_isotopes * _ratio[:, np.newaxis]
+
+        stack_sigma[compound][element] = {}
+        for _iso, _sigma_iso in zip(_list_isotopes, _sigma_isotopes):
+            stack_sigma[compound][element][_iso] = {}
+            stack_sigma[compound][element][_iso]['energy_eV'] = self.energy_eV
+            stack_sigma[compound][element][_iso]['sigma_b'] = _sigma_iso
+
+        # sigma for all isotopes with their isotopic ratio
+        stack_sigma[compound][element]['energy_eV'] = self.energy_eV
+        stack_sigma[compound][element]['sigma_b'] = _sigma_isotopes.sum(axis=0)
 
     def plot(self, transmission=False, x_axis='energy', mixed=True, all_layers=False, all_elements=False,
              all_isotopes=False, items_to_plot=[], time_unit='us', offset_us=2.99, time_resolution_us=0.16,
-             source_to_detector_m=16.125):
+             source_to_detector_m=16.125, logx=None):
         # offset delay values is normal 2.99 us with NONE actual MCP delay settings
         """display the transmission or attenuation of compound, element and/or isotopes specified
 
@@ -572,6 +1165,8 @@ class Resonance(object):
             ex:
                 [['CoAg','Ag','107-Ag'], ['CoAg']]
             if the dictionary is empty, everything is plotted
+        logx: boolean (default None). True -> logarithmic x-axis
+                                      None -> logarithmic x-axis if the energy grid is 'log'
         """
         plt.figure(figsize=[8, 8])
 
@@ -654,6 +1249,10 @@ class Resonance(object):
             _y_axis = _live_path[y_axis_tag]
             plt.plot(_x_axis, _y_axis, label=_label)
 
+        if logx is None:
+            logx = self.grid == 'log'
+        if logx:
+            plt.xscale('log')
         plt.ylim(-0.01, 1.01)
         plt.xlabel(x_axis_label)
         plt.ylabel(y_axis_label)
@@ -0,0 +1,35 @@
+"""compare the time needed to read the isotope csv files of a database with pandas and with
+ImagingReso._database.read_isotope_csv
+
+    $ python benchmarks/read_database.py ENDF_VIII
+"""
+import os
+import sys
+import timeit
+import pandas as pd
+
+from ImagingReso import _database
+
+
+def main(database='ENDF_VIII', repeat=5):
+    _database_folder = _database.get_database_folder(database=database)
+    _list_files = sorted([os.path.join(_database_folder, _file)
+                          for _file in os.listdir(_database_folder) if _file.endswith('.csv')])
+
+    def _read_with_pandas():
+        for _file in _list_files:
+            pd.read_csv(_file, header=1)
+
+    def _read_with_reader():
+        for _file in _list_files:
+            _database.read_isotope_csv(file_name=_file)
+
+    print("{} ({} files)".format(_database_folder, len(_list_files)))
+    for _name, _function in [('pandas.read_csv', _read_with_pandas),
+                             ('read_isotope_csv', _read_with_reader)]:
+        _time = min(timeit.repeat(_function, number=1, repeat=repeat))
+        print("{:>20}: {:8.1f} ms".format(_name, _time * 1e3))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
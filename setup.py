@@ -20,6 +20,9 @@ setup(
                                      'reference_data/ENDF_VIII/*']},
     include_package_data = True,
     test_suite = 'tests',
+    entry_points = {
+        'console_scripts': ['imagingreso-pack-database = ImagingReso._database:main'],
+    },
     install_requires = [
         'numpy',
         'pandas',
@@ -0,0 +1,353 @@
+import unittest
+import copy
+import numpy as np
+import os
+import shutil
+import tempfile
+import pandas as pd
+
+from ImagingReso import _database
+from ImagingReso._database import *
+from ImagingReso._utilities import get_database_data, get_sigma
+from ImagingReso.resonance import Resonance
+
+
+class TestCompiledDatabase(unittest.TestCase):
+    def setUp(self):
+        _file_path = os.path.dirname(__file__)
+        _reference_path = os.path.abspath(os.path.join(_file_path, '../../ImagingReso/reference_data/ENDF_VII'))
+        self.tmp_folder = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.tmp_folder, 'ENDF_VII')
+        shutil.copytree(_reference_path, self.database_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_folder)
+
+    def test_compile_database_raises_error_if_wrong_database(self):
+        """assert ValueError if wrong database passed to compile_database"""
+        self.assertRaises(ValueError, compile_database, database='do_not_exist')
+
+    def test_compiled_data_matches_csv(self):
+        """assert get_compiled_data returns the same arrays as the csv file"""
+        file_name = os.path.join(self.database_path, 'Ag-107.csv')
+        self.assertIsNone(get_compiled_data(file_name=file_name))
+
+        compile_database(database=self.database_path)
+        _compiled = get_compiled_data(file_name=file_name)
+        _df = pd.read_csv(file_name, header=1)
+        self.assertTrue((_compiled['E_eV'] == np.array(_df['E_eV'])).all())
+        self.assertTrue((_compiled['Sig_b'] == np.array(_df['Sig_b'])).all())
+        self.assertFalse(_compiled['Sig_b'].flags.writeable)
+
+    def test_get_database_data_and_get_sigma_use_compiled_database(self):
+        """assert get_database_data and get_sigma return the same results with a compiled database"""
+        file_name = os.path.join(self.database_path, 'O-16.csv')
+        _df_expected = get_database_data(file_name=file_name)
+        _sigma_expected = get_sigma(database_file_name=file_name, E_min=1, E_max=100, E_step=1)
+
+        compile_database(database=self.database_path)
+        _df_returned = get_database_data(file_name=file_name)
+        _sigma_returned = get_sigma(database_file_name=file_name, E_min=1, E_max=100, E_step=1)
+        self.assertTrue(isinstance(_df_returned, pd.DataFrame))
+        self.assertTrue((_df_expected.values == _df_returned.values).all())
+        self.assertTrue((_sigma_expected['sigma_b'] == _sigma_returned['sigma_b']).all())
+
+
+    def test_compile_database_raises_error_if_wrong_dtype(self):
+        """assert ValueError if dtype is not float64 or float32"""
+        self.assertRaises(ValueError, compile_database, database=self.database_path, dtype='int32')
+
+    def test_float32_and_compressed_compiled_data(self):
+        """assert float32 and compressed databases return the same values as the csv file"""
+        _data = read_isotope_csv(file_name=os.path.join(self.database_path, 'Ag-107.csv'))
+        _compiled_file = os.path.join(self.tmp_folder, 'ENDF_VII.bin')
+        file_name = os.path.join(_compiled_file, 'Ag-107.csv')
+        for dtype, compress in [('float32', False), ('float64', True), ('float32', True)]:
+            compile_database(database=self.database_path, file_name=_compiled_file, dtype=dtype, compress=compress)
+            _compiled = get_compiled_data(file_name=file_name)
+            self.assertEqual(_compiled['E_eV'].dtype, np.float64)
+            self.assertEqual(_compiled['Sig_b'].dtype, np.dtype(dtype))
+            self.assertTrue((_compiled['E_eV'] == _data[0]).all())
+            self.assertTrue((_compiled['Sig_b'] == _data[1].astype(dtype)).all())
+
+            _compiled = get_compiled_data(file_name=file_name, E_min=300, E_max=600)
+            _start, _end = get_window(energy=_data[0], E_min=300, E_max=600)
+            self.assertTrue((_compiled['E_eV'] == _data[0, _start:_end]).all())
+
+    def test_compiled_database_of_folder_is_lossless(self):
+        """assert the compiled database read instead of the csv files can not be float32 or without duplicates"""
+        self.assertRaises(ValueError, compile_database, database=self.database_path, dtype='float32')
+        self.assertRaises(ValueError, compile_database, database=self.database_path, duplicates='drop')
+        self.assertRaises(ValueError, compile_database, database=self.database_path,
+                          file_name=os.path.join(self.database_path, COMPILED_FILE_NAME), duplicates='drop')
+        self.assertFalse(os.path.exists(os.path.join(self.database_path, COMPILED_FILE_NAME)))
+        self.assertEqual(main([self.database_path, '--dtype', 'float32']), 1)
+        self.assertEqual(main([self.database_path]), 0)
+        self.assertIsNotNone(get_compiled_data(file_name=os.path.join(self.database_path, 'Ag-107.csv')))
+
+    def test_lossy_compiled_database_of_folder_is_ignored(self):
+        """assert a compiled database of the folder with values different from the csv files is not used"""
+        file_name = os.path.join(self.database_path, 'Ag-107.csv')
+        _compiled_file = compile_database(database=self.database_path, file_name=os.path.join(self.tmp_folder,
+                                                                                              'lossy.bin'),
+                                          duplicates='drop')
+        shutil.move(_compiled_file, os.path.join(self.database_path, COMPILED_FILE_NAME))
+        self.assertIsNone(get_compiled_data(file_name=file_name))
+        _df = pd.read_csv(file_name, header=1)
+        self.assertTrue((get_database_data(file_name=file_name)['Sig_b'].values == np.array(_df['Sig_b'])).all())
+
+
+class TestPackDatabase(unittest.TestCase):
+    def setUp(self):
+        _file_path = os.path.dirname(__file__)
+        self.reference_path = os.path.abspath(os.path.join(_file_path, '../../ImagingReso/reference_data/ENDF_VII'))
+        self.tmp_folder = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.tmp_folder, 'ENDF_VII.bin')
+        self.stack = {'AgCo': {'elements': ['Ag', 'Co'],
+                               'stoichiometric_ratio': [1, 1],
+                               'thickness': {'value': 0.025,
+                                             'units': 'mm'},
+                               },
+                      }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_folder)
+
+    def test_pack_database_rejects_duplicates_if_asked(self):
+        """assert the command line fails if duplicate energies are not allowed"""
+        _status = main([self.reference_path, '-o', self.file_name, '--duplicates', 'error'])
+        self.assertEqual(_status, 1)
+        self.assertFalse(os.path.exists(self.file_name))
+
+    def test_compile_database_raises_error_if_energies_not_sorted(self):
+        """assert ValueError if the energies of a file are not sorted"""
+        _database_path = os.path.join(self.tmp_folder, 'ENDF_VII')
+        shutil.copytree(self.reference_path, _database_path)
+        with open(os.path.join(_database_path, 'Co-58.csv'), 'a') as _f:
+            _f.write('1e-06,1.0\n')
+        self.assertRaises(ValueError, compile_database, database=_database_path, file_name=self.file_name)
+
+    def test_packed_database_used_as_resonance_database(self):
+        """assert a Resonance object gives the same results with the packed file as with the folder"""
+        _status = main([self.reference_path, '-o', self.file_name, '--duplicates', 'keep'])
+        self.assertEqual(_status, 0)
+        self.assertEqual(get_manifest(database=self.file_name)['elements']['O']['isotopes'],
+                         ['16-O', '17-O', '18-O'])
+
+        o_reso_folder = Resonance(stack=copy.deepcopy(self.stack), energy_min=1, energy_max=100, energy_step=0.1,
+                                  database='ENDF_VII')
+        o_reso_packed = Resonance(stack=copy.deepcopy(self.stack), energy_min=1, energy_max=100, energy_step=0.1,
+                                  database=self.file_name)
+        self.assertTrue((o_reso_folder.total_signal['transmission'] ==
+                         o_reso_packed.total_signal['transmission']).all())
+
+    def test_packed_database_without_duplicates(self):
+        """assert duplicate energies can be dropped and results are unchanged"""
+        self.assertEqual(main([self.reference_path, '-o', self.file_name, '--duplicates', 'drop']), 0)
+        _packed = get_compiled_data(file_name=os.path.join(self.file_name, 'Ag-107.csv'))
+        self.assertTrue((np.diff(_packed['E_eV']) > 0).all())
+
+        o_reso_folder = Resonance(stack=copy.deepcopy(self.stack), energy_min=1, energy_max=100, energy_step=0.1,
+                                  database='ENDF_VII')
+        o_reso_packed = Resonance(stack=copy.deepcopy(self.stack), energy_min=1, energy_max=100, energy_step=0.1,
+                                  database=self.file_name)
+        self.assertTrue(np.allclose(o_reso_folder.total_signal['transmission'],
+                                    o_reso_packed.total_signal['transmission'], rtol=1e-5, atol=0))
+
+
+class TestReader(unittest.TestCase):
+    def setUp(self):
+        _file_path = os.path.dirname(__file__)
+        self.database_path = os.path.abspath(os.path.join(_file_path, '../../ImagingReso/reference_data/ENDF_VII'))
+
+    def test_read_isotope_csv_raises_error_if_wrong_file(self):
+        """assert IOError if file does not exist"""
+        self.assertRaises(IOError, read_isotope_csv, file_name='do_not_exist')
+
+    def test_read_isotope_csv_matches_pandas(self):
+        """assert read_isotope_csv returns the same values as pandas.read_csv"""
+        file_name = os.path.join(self.database_path, 'Co-58.csv')
+        _df = pd.read_csv(file_name, header=1)
+        _data = read_isotope_csv(file_name=file_name)
+        self.assertEqual(_data.shape, (2, len(_df)))
+        self.assertTrue((_data[0] == np.array(_df['E_eV'])).all())
+        self.assertTrue((_data[1] == np.array(_df['Sig_b'])).all())
+
+    def test_read_isotope_csv_fills_buffer(self):
+        """assert read_isotope_csv writes into the buffer provided and checks its size"""
+        file_name = os.path.join(self.database_path, 'Co-58.csv')
+        _nbr_rows = read_isotope_csv(file_name=file_name).shape[1]
+        _buffer = np.zeros((2, _nbr_rows + 10))
+        _data = read_isotope_csv(file_name=file_name, out=_buffer[:, 10:])
+        self.assertTrue((_buffer[:, 10:] == _data).all())
+        self.assertTrue((_buffer[:, :10] == 0).all())
+        self.assertRaises(ValueError, read_isotope_csv, file_name=file_name, out=_buffer)
+
+
+class TestWindow(unittest.TestCase):
+    def setUp(self):
+        _file_path = os.path.dirname(__file__)
+        _reference_path = os.path.abspath(os.path.join(_file_path, '../../ImagingReso/reference_data/ENDF_VII'))
+        self.tmp_folder = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.tmp_folder, 'ENDF_VII')
+        shutil.copytree(_reference_path, self.database_path)
+        self.file_name = os.path.join(self.database_path, 'Ag-107.csv')
+        self.data = read_isotope_csv(file_name=self.file_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_folder)
+
+    def test_get_window(self):
+        """assert get_window returns the rows bracketing the energy range"""
+        _energy = np.array([1., 2., 3., 4., 5.])
+        self.assertEqual(get_window(energy=_energy, E_min=2.5, E_max=3.5), (1, 4))
+        self.assertEqual(get_window(energy=_energy, E_min=2, E_max=3), (1, 4))
+        self.assertEqual(get_window(energy=_energy, E_min=0.5, E_max=10), (0, 5))
+        self.assertEqual(get_window(energy=_energy), (0, 5))
+        _energy = np.array([1., 2., 2., 3., 3., 4.])
+        self.assertEqual(get_window(energy=_energy, E_min=2, E_max=3), (2, 6))
+
+    def test_window_on_repeated_energy(self):
+        """assert the windowed tables interpolate like the entire table when E_max is a repeated energy"""
+        _backend = get_backend('ENDF_VIII')
+        for _file_name, _energy in [('Ag-111.csv', 116.891), ('Au-197.csv', 106.58)]:
+            _full = _backend.get_data(file_name=_file_name)
+            self.assertGreater(np.count_nonzero(_full['E_eV'] == _energy), 1)
+            _window = _backend.get_data(file_name=_file_name, E_min=_energy - 1, E_max=_energy)
+            self.assertEqual(np.interp(_energy, _window['E_eV'], _window['Sig_b']),
+                             np.interp(_energy, _full['E_eV'], _full['Sig_b']))
+
+    def test_read_isotope_csv_window(self):
+        """assert read_isotope_csv_window returns the same rows as the entire file"""
+        _index = build_manifest(database=self.database_path)['elements']['Ag']['index'][0]
+        for E_min, E_max in [(0.001, 1), (300, 600), (1e-5, 3e3)]:
+            _start, _end = get_window(energy=self.data[0], E_min=E_min, E_max=E_max)
+            _window = read_isotope_csv_window(file_name=self.file_name, index=_index, E_min=E_min, E_max=E_max)
+            self.assertTrue((_window == self.data[:, _start:_end]).all())
+
+        # index does not match the file anymore
+        with open(self.file_name, 'a') as _f:
+            _f.write('2e7,1.0\n')
+        self.assertIsNone(read_isotope_csv_window(file_name=self.file_name, index=_index, E_min=1, E_max=2))
+
+    def test_readers_without_numpy_c_loadtxt(self):
+        """assert the readers give the same rows with pandas as with np.loadtxt (numpy < 1.23)"""
+        _index = build_manifest(database=self.database_path)['elements']['Ag']['index'][0]
+        _zip_file = shutil.make_archive(os.path.join(self.tmp_folder, 'ENDF_VII'), 'zip', root_dir=self.database_path)
+        _numpy_c_loadtxt = _database._NUMPY_C_LOADTXT
+        try:
+            _database._NUMPY_C_LOADTXT = False
+            self.assertTrue((read_isotope_csv(file_name=self.file_name) == self.data).all())
+            _window = read_isotope_csv_window(file_name=self.file_name, index=_index, E_min=300, E_max=600)
+            _start, _end = get_window(energy=self.data[0], E_min=300, E_max=600)
+            self.assertTrue((_window == self.data[:, _start:_end]).all())
+            self.assertTrue((ZipBackend(file_name=_zip_file)._read(file_name='Ag-107.csv') == self.data).all())
+        finally:
+            _database._NUMPY_C_LOADTXT = _numpy_c_loadtxt
+
+    def test_compiled_data_window(self):
+        """assert get_compiled_data returns only the rows bracketing the energy range"""
+        compile_database(database=self.database_path)
+        _compiled = get_compiled_data(file_name=self.file_name, E_min=300, E_max=600)
+        _start, _end = get_window(energy=self.data[0], E_min=300, E_max=600)
+        self.assertTrue((_compiled['E_eV'] == self.data[0, _start:_end]).all())
+        self.assertTrue((_compiled['Sig_b'] == self.data[1, _start:_end]).all())
+        self.assertLessEqual(_compiled['E_eV'][0], 300)
+        self.assertGreaterEqual(_compiled['E_eV'][-1], 600)
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        _file_path = os.path.dirname(__file__)
+        _reference_path = os.path.abspath(os.path.join(_file_path, '../../ImagingReso/reference_data/ENDF_VII'))
+        self.tmp_folder = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.tmp_folder, 'ENDF_VII')
+        shutil.copytree(_reference_path, self.database_path)
+        os.remove(os.path.join(self.database_path, MANIFEST_FILE_NAME))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_folder)
+
+    def test_build_manifest_raises_error_if_wrong_database(self):
+        """assert ValueError if wrong database passed to build_manifest"""
+        self.assertRaises(ValueError, build_manifest, database='do_not_exist')
+
+    def test_build_manifest(self):
+        """assert build_manifest lists the isotopes of each element sorted by mass number"""
+        _manifest = build_manifest(database=self.database_path)
+        self.assertTrue(os.path.exists(os.path.join(self.database_path, MANIFEST_FILE_NAME)))
+        self.assertEqual(sorted(_manifest['elements'].keys()), ['Ag', 'Au', 'Co', 'Gd', 'O'])
+        _oxygen = _manifest['elements']['O']
+        self.assertEqual(_oxygen['isotopes'], ['16-O', '17-O', '18-O'])
+        self.assertEqual(_oxygen['file_names'], ['O-16.csv', 'O-17.csv', 'O-18.csv'])
+        _df = pd.read_csv(os.path.join(self.database_path, 'O-16.csv'), header=1)
+        self.assertEqual(_oxygen['rows'][0], len(_df))
+        self.assertEqual(_oxygen['energy_min'][0], _df['E_eV'].iloc[0])
+        self.assertEqual(_oxygen['energy_max'][0], _df['E_eV'].iloc[-1])
+
+    def test_get_manifest_ignores_out_of_date_manifest(self):
+        """assert get_manifest rebuilds the manifest if the csv files changed"""
+        build_manifest(database=self.database_path)
+        os.remove(os.path.join(self.database_path, 'O-18.csv'))
+        _database._manifests.clear()
+        _manifest = get_manifest(database=self.database_path)
+        self.assertEqual(_manifest['elements']['O']['isotopes'], ['16-O', '17-O'])
+
+
+class TestBackend(unittest.TestCase):
+    def setUp(self):
+        _file_path = os.path.dirname(__file__)
+        self.reference_path = os.path.abspath(os.path.join(_file_path, '../../ImagingReso/reference_data/ENDF_VII'))
+        self.tmp_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_folder)
+
+    def test_get_backend_raises_error_if_wrong_database(self):
+        """assert ValueError if wrong database passed to get_backend"""
+        self.assertRaises(ValueError, get_backend, database='do_not_exist')
+
+    def test_csv_folder_backend(self):
+        """assert get_backend returns the csv folder backend of the database"""
+        _backend = get_backend(database=self.reference_path)
+        self.assertTrue(isinstance(_backend, CsvFolderBackend))
+        self.assertIs(_backend, get_backend(database=self.reference_path))
+        self.assertEqual(_backend.list_elements(), ['Ag', 'Au', 'Co', 'Gd', 'O'])
+        self.assertEqual(_backend.list_isotopes(element='O'), ['O-16.csv', 'O-17.csv', 'O-18.csv'])
+        self.assertRaises(IOError, _backend.get_data, file_name='do_not_exist.csv')
+
+    def test_memory_backend(self):
+        """assert a memory backend can be used as the database of Resonance"""
+        _energy = np.array([0., 1., 2., 3., 4., 5.])
+        _sigma = np.array([10., 10., 10., 10., 10., 10.])
+        _backend = MemoryBackend(data={'Ag-107.csv': (_energy, _sigma),
+                                       'Ag-109.csv': (_energy, 3 * _sigma)})
+        self.assertEqual(_backend.list_isotopes(element='Ag'), ['Ag-107.csv', 'Ag-109.csv'])
+        _table = _backend.get_data(file_name='Ag-107.csv', E_min=1.5, E_max=2.5)
+        self.assertTrue(all(_table['E_eV'] == [1., 2., 3.]))
+
+        o_reso = Resonance(energy_min=1, energy_max=4, energy_step=1, database=_backend)
+        o_reso.add_layer(formula='Ag', thickness=0.025)
+        _ratio = o_reso.stack['Ag']['Ag']['isotopes']['isotopic_ratio']
+        _sigma_expected = 10 * _ratio[0] + 30 * _ratio[1]
+        _sigma_returned = o_reso.stack_sigma['Ag']['Ag']['sigma_b']
+        self.assertTrue(np.allclose(_sigma_returned, _sigma_expected))
+
+    def test_memory_backend_raises_error_if_wrong_shape(self):
+        """assert ValueError if energy and sigma do not have the same size"""
+        self.assertRaises(ValueError, MemoryBackend, data={'Ag-107.csv': ([1., 2.], [1.])})
+
+    def test_zip_backend_matches_csv_folder(self):
+        """assert a zip archive of the csv files gives the same transmission as the folder"""
+        _zip_file = shutil.make_archive(os.path.join(self.tmp_folder, 'ENDF_VII'), 'zip',
+                                        root_dir=self.reference_path)
+        _backend = get_backend(database=_zip_file)
+        self.assertTrue(isinstance(_backend, ZipBackend))
+        self.assertEqual(_backend.list_elements(), ['Ag', 'Au', 'Co', 'Gd', 'O'])
+
+        o_folder = Resonance(energy_min=1, energy_max=100, energy_step=0.1, database=self.reference_path)
+        o_folder.add_layer(formula='AgCo', thickness=0.025)
+        o_zip = Resonance(energy_min=1, energy_max=100, energy_step=0.1, database=_zip_file)
+        o_zip.add_layer(formula='AgCo', thickness=0.025)
+        self.assertTrue(np.array_equal(o_zip.total_signal['transmission'],
+                                       o_folder.total_signal['transmission']))
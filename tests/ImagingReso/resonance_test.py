@@ -1,7 +1,10 @@
 import unittest
+import pickle
 import numpy as np
 
 from ImagingReso.resonance import Resonance
+from ImagingReso import _utilities
+from ImagingReso._database import get_backend
 
 
 class TestInitialization(unittest.TestCase):
@@ -651,3 +654,489 @@ class TestTransmissionAttenuation(unittest.TestCase):
         self.assertAlmostEqual(expected_tran_0, attenuation[0], delta=0.001)
         self.assertAlmostEqual(expected_tran_1, attenuation[1], delta=0.001)
         self.assertAlmostEqual(expected_tran_2, attenuation[2], delta=0.001)
+
+
+class TestDtype(unittest.TestCase):
+    def setUp(self):
+        self.stack = {'CoAg': {'elements': ['Co', 'Ag'],
+                               'stoichiometric_ratio': [1, 2],
+                               'thickness': {'value': 0.025,
+                                             'units': 'mm'},
+                               },
+                      }
+
+    def test_wrong_dtype_raises_error(self):
+        """assert ValueError if dtype is not a supported float type"""
+        self.assertRaises(ValueError, Resonance, stack=self.stack, dtype=np.int32)
+
+    def test_float32_transmission(self):
+        """assert float32 is carried through sigma and signals and matches float64 results"""
+        o_reso_64 = Resonance(stack=self.stack, energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso_32 = Resonance(stack=self.stack, energy_min=1, energy_max=100, energy_step=0.1, dtype=np.float32)
+        self.assertEqual(o_reso_32.stack_sigma['CoAg']['Ag']['107-Ag']['sigma_b'].dtype, np.float32)
+        self.assertEqual(o_reso_32.stack_signal['CoAg']['Ag']['transmission'].dtype, np.float32)
+        self.assertEqual(o_reso_32.total_signal['transmission'].dtype, np.float32)
+        self.assertTrue(np.allclose(o_reso_32.total_signal['transmission'],
+                                    o_reso_64.total_signal['transmission'], rtol=1e-6, atol=0))
+
+
+class TestEnergyGrid(unittest.TestCase):
+    def setUp(self):
+        self.stack = {'CoAg': {'elements': ['Co', 'Ag'],
+                               'stoichiometric_ratio': [1, 2],
+                               'thickness': {'value': 0.025,
+                                             'units': 'mm'},
+                               },
+                      }
+
+    def test_wrong_grid_raises_error(self):
+        """assert ValueError if grid is not supported or energy axis is not sorted"""
+        self.assertRaises(ValueError, Resonance, stack=self.stack, grid='unknown')
+        self.assertRaises(ValueError, Resonance, stack=self.stack, grid='log', points_per_decade=0)
+        self.assertRaises(ValueError, Resonance, stack=self.stack, energy=[10., 5., 20.])
+        self.assertRaises(ValueError, Resonance, stack=self.stack, energy=[0., 5., 20.])
+
+    def test_energy_axis_is_shared(self):
+        """assert every isotope, element, compound and the total signal reference the same read-only axis"""
+        o_reso = Resonance(stack=self.stack, energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso.add_layer(formula='Gd', thickness=0.01)
+        _energy = o_reso.energy_eV
+        self.assertFalse(_energy.flags.writeable)
+        self.assertIs(o_reso.total_signal['energy_eV'], _energy)
+        for _compound in o_reso.stack.keys():
+            self.assertIs(o_reso.stack_signal[_compound]['energy_eV'], _energy)
+            for _element in o_reso.stack[_compound]['elements']:
+                self.assertIs(o_reso.stack_sigma[_compound][_element]['energy_eV'], _energy)
+                self.assertIs(o_reso.stack_signal[_compound][_element]['energy_eV'], _energy)
+                for _iso in o_reso.stack[_compound][_element]['isotopes']['list']:
+                    self.assertIs(o_reso.stack_sigma[_compound][_element][_iso]['energy_eV'], _energy)
+                    self.assertIs(o_reso.stack_signal[_compound][_element][_iso]['energy_eV'], _energy)
+
+    def test_log_grid(self):
+        """assert log grid has points_per_decade points per decade and is carried through the signals"""
+        o_reso = Resonance(stack=self.stack, energy_min=1, energy_max=1000, grid='log', points_per_decade=50)
+        _energy = o_reso.total_signal['energy_eV']
+        self.assertEqual(len(_energy), 151)
+        self.assertEqual(_energy[0], 1)
+        self.assertEqual(_energy[-1], 1000)
+        self.assertAlmostEqual(_energy[50], 10)
+        self.assertEqual(len(o_reso.stack_signal['CoAg']['Ag']['107-Ag']['transmission']), 151)
+        self.assertEqual(len(o_reso.total_signal['transmission']), 151)
+
+    def test_user_energy_axis(self):
+        """assert the energy axis provided gives the same signal as the linear grid at these energies"""
+        o_reso_linear = Resonance(stack=self.stack, energy_min=1, energy_max=100, energy_step=0.1)
+        _energy = o_reso_linear.total_signal['energy_eV'][::7]
+        o_reso = Resonance(stack=self.stack, energy=_energy)
+        self.assertEqual(o_reso.energy_min, _energy[0])
+        self.assertEqual(o_reso.energy_max, _energy[-1])
+        self.assertTrue(np.array_equal(o_reso.total_signal['energy_eV'], _energy))
+        self.assertTrue(np.array_equal(o_reso.total_signal['transmission'],
+                                       o_reso_linear.total_signal['transmission'][::7]))
+
+    def test_adaptive_grid(self):
+        """assert adaptive grid keeps the sigma of every isotope within tolerance with fewer points"""
+        o_reso = Resonance(stack=self.stack, energy_min=1, energy_max=100, grid='adaptive', tolerance=1e-3)
+        _energy = o_reso.total_signal['energy_eV']
+        self.assertEqual(_energy[0], 1)
+        self.assertEqual(_energy[-1], 100)
+        self.assertLess(len(_energy), 10000)
+        _list_file_names = o_reso.stack['CoAg']['Co']['isotopes']['file_names'] + \
+                           o_reso.stack['CoAg']['Ag']['isotopes']['file_names']
+        for _file in _list_file_names:
+            _table = _utilities._get_database_table(file_name=_file, E_min=1, E_max=100, database=o_reso.database)
+            _inside = (_table['E_eV'] >= 1) & (_table['E_eV'] <= 100) & np.append(np.diff(_table['E_eV']) != 0, True)
+            _sigma = _utilities.get_sigma(database_file_name=_file, energy=_energy, database=o_reso.database)
+            _sigma_interpolated = np.interp(_table['E_eV'][_inside], _energy, _sigma['sigma_b'])
+            _error = np.abs(_sigma_interpolated - _table['Sig_b'][_inside]) / _table['Sig_b'][_inside]
+            self.assertLessEqual(_error.max(), 1e-3 * (1 + 1e-9))
+
+    def test_wrong_max_workers_raises_error(self):
+        """assert ValueError is raised if the number of workers is not > 0"""
+        self.assertRaises(ValueError, Resonance, max_workers=0)
+
+    def test_isotopes_loaded_with_threads(self):
+        """assert the sigma of the stack are the same when the isotopes are loaded with or without threads"""
+        _utilities.cache_clear(cache='sigma')
+        o_reso_1 = Resonance(energy_min=1, energy_max=100, energy_step=0.1, max_workers=1)
+        o_reso_1.add_layer(formula='CoAg', thickness=0.025)
+        _utilities.cache_clear(cache='sigma')
+        o_reso_4 = Resonance(energy_min=1, energy_max=100, energy_step=0.1, max_workers=4)
+        o_reso_4.add_layer(formula='CoAg', thickness=0.025)
+        self.assertTrue(np.array_equal(o_reso_1.stack_sigma['CoAg']['Ag']['sigma_b'],
+                                       o_reso_4.stack_sigma['CoAg']['Ag']['sigma_b']))
+        self.assertTrue(np.array_equal(o_reso_1.total_signal['transmission'], o_reso_4.total_signal['transmission']))
+
+    def test_wrong_tolerance_raises_error(self):
+        """assert ValueError if tolerance of the adaptive grid is not > 0"""
+        self.assertRaises(ValueError, Resonance, stack=self.stack, grid='adaptive', tolerance=0)
+
+    def test_native_grid(self):
+        """assert native grid is the union of the energies of the isotopes and gives their exact sigma"""
+        o_reso = Resonance(stack=self.stack, energy_min=1, energy_max=100, grid='native')
+        _energy = o_reso.total_signal['energy_eV']
+        self.assertIs(o_reso.stack_signal['CoAg']['energy_eV'], _energy)
+        _expected = [[1, 100]]
+        _list_file_names = o_reso.stack['CoAg']['Co']['isotopes']['file_names'] + \
+                           o_reso.stack['CoAg']['Ag']['isotopes']['file_names']
+        for _file in _list_file_names:
+            _table = _utilities._get_database_table(file_name=_file, E_min=1, E_max=100, database=o_reso.database)
+            _inside = (_table['E_eV'] > 1) & (_table['E_eV'] < 100)
+            _expected.append(_table['E_eV'][_inside])
+        self.assertTrue(np.array_equal(_energy, np.unique(np.concatenate(_expected))))
+
+        _table = _utilities._get_database_table(file_name='Co-59.csv', database=o_reso.database)
+        _inside = (_table['E_eV'] > 1) & (_table['E_eV'] < 100) & np.append(np.diff(_table['E_eV']) != 0, True)
+        _sigma = _utilities.get_sigma(database_file_name='Co-59.csv', energy=_energy,
+                                      database=o_reso.database)['sigma_b']
+        self.assertTrue(np.array_equal(_sigma[np.searchsorted(_energy, _table['E_eV'][_inside])],
+                                       _table['Sig_b'][_inside]))
+
+
+class TestAddLayer(unittest.TestCase):
+    def test_add_layer_matches_full_calculation(self):
+        """assert adding layers one by one gives the same signal as the stack defined at once"""
+        o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        _stack = {}
+        for _formula, _thickness in [('Ag', 0.025), ('CoAg', 0.03), ('Gd', 0.01)]:
+            o_reso.add_layer(formula=_formula, thickness=_thickness)
+            _stack.update(_utilities.formula_to_dictionary(formula=_formula, thickness=_thickness))
+        o_reso_all = Resonance(stack=_stack, energy_min=1, energy_max=100, energy_step=0.1)
+        self.assertEqual(list(o_reso.stack_signal.keys()), ['Ag', 'CoAg', 'Gd'])
+        self.assertTrue(np.array_equal(o_reso.total_signal['transmission'],
+                                       o_reso_all.total_signal['transmission']))
+        self.assertTrue(np.array_equal(o_reso.total_signal['attenuation'],
+                                       o_reso_all.total_signal['attenuation']))
+        for _compound in _stack.keys():
+            self.assertTrue(np.array_equal(o_reso.stack_signal[_compound]['transmission'],
+                                           o_reso_all.stack_signal[_compound]['transmission']))
+            self.assertIs(o_reso.stack_signal[_compound]['energy_eV'], o_reso.energy_eV)
+
+    def test_add_layer_loads_only_new_layer(self):
+        """assert the sigma of the layers already in the stack are not loaded again"""
+        o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso.add_layer(formula='Ag', thickness=0.025)
+        _utilities.cache_clear()
+        o_reso.add_layer(formula='Co', thickness=0.025)
+        _info = _utilities.cache_info(cache='sigma')
+        self.assertEqual(_info['hits'], 0)
+        self.assertEqual(_info['misses'], len(o_reso.stack['Co']['Co']['isotopes']['file_names']))
+
+    def test_add_layer_replacing_layer(self):
+        """assert a layer added twice replaces the previous one"""
+        o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso.add_layer(formula='Ag', thickness=0.025)
+        o_reso.add_layer(formula='Ag', thickness=0.05)
+        o_reso_expected = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso_expected.add_layer(formula='Ag', thickness=0.05)
+        self.assertTrue(np.array_equal(o_reso.total_signal['transmission'],
+                                       o_reso_expected.total_signal['transmission']))
+
+
+class TestSetIsotopicRatio(unittest.TestCase):
+    def setUp(self):
+        self.o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        self.o_reso.add_layer(formula='CoAg', thickness=0.025)
+        self.o_reso.add_layer(formula='Gd', thickness=0.01)
+        _nbr_isotopes = len(self.o_reso.stack['CoAg']['Ag']['isotopes']['list'])
+        self.list_ratio = [1. / _nbr_isotopes] * _nbr_isotopes
+
+    def test_set_isotopic_ratio_does_not_load_sigma(self):
+        """assert set_isotopic_ratio reweights the sigma already loaded"""
+        _utilities.cache_clear()
+        self.o_reso.set_isotopic_ratio(compound='CoAg', element='Ag', list_ratio=self.list_ratio)
+        _info = _utilities.cache_info(cache='sigma')
+        self.assertEqual(_info['hits'] + _info['misses'], 0)
+
+    def test_set_isotopic_ratio_matches_full_calculation(self):
+        """assert set_isotopic_ratio gives the same signal as recalculating the entire stack"""
+        self.o_reso.set_isotopic_ratio(compound='CoAg', element='Ag', list_ratio=self.list_ratio)
+        _sigma = self.o_reso.stack_sigma['CoAg']['Ag']['sigma_b']
+        _transmission = self.o_reso.total_signal['transmission']
+        _transmission_compound = self.o_reso.stack_signal['CoAg']['transmission']
+        self.o_reso._Resonance__math_on_stack()
+        self.assertTrue(np.array_equal(_sigma, self.o_reso.stack_sigma['CoAg']['Ag']['sigma_b']))
+        self.assertTrue(np.array_equal(_transmission_compound, self.o_reso.stack_signal['CoAg']['transmission']))
+        self.assertTrue(np.array_equal(_transmission, self.o_reso.total_signal['transmission']))
+
+
+class TestStackSignal(unittest.TestCase):
+    def test_stack_signal_matches_product_of_elements(self):
+        """assert transmission of compounds and stack match the product of the transmission of their elements"""
+        o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso.add_layer(formula='CoAg', thickness=0.025)
+        o_reso.add_layer(formula='Gd', thickness=0.01)
+        _total_transmission = 1.
+        for _compound in o_reso.stack.keys():
+            _transmission = 1.
+            for _element in o_reso.stack[_compound]['elements']:
+                _transmission = _transmission * o_reso.stack_signal[_compound][_element]['transmission']
+            self.assertTrue(np.allclose(o_reso.stack_signal[_compound]['transmission'], _transmission,
+                                        rtol=1e-12, atol=0))
+            _total_transmission = _total_transmission * _transmission
+        self.assertTrue(np.allclose(o_reso.total_signal['transmission'], _total_transmission, rtol=1e-12, atol=0))
+
+    def test_stack_signal_is_calculated_on_request(self):
+        """assert the signal of an entry is calculated only when accessed, and until the stack changes"""
+        o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso.add_layer(formula='CoAg', thickness=0.025)
+        _stack_signal = o_reso.stack_signal
+        self.assertIs(o_reso.stack_signal, _stack_signal)
+        self.assertFalse(_stack_signal.is_calculated('CoAg'))
+
+        _compound_signal = _stack_signal['CoAg']
+        self.assertEqual(list(_compound_signal.keys()),
+                         ['Co', 'Ag', 'optical_depth', 'transmission', 'attenuation', 'energy_eV'])
+        _transmission = _compound_signal['transmission']
+        self.assertFalse(_compound_signal.is_calculated('attenuation'))
+        self.assertFalse(_compound_signal.is_calculated('Ag'))
+        self.assertTrue(np.allclose(_compound_signal['attenuation'], 1. - _transmission, rtol=0, atol=1e-15))
+        self.assertIs(_stack_signal['CoAg']['transmission'], _transmission)
+
+        o_reso.add_layer(formula='Gd', thickness=0.01)
+        self.assertIsNot(o_reso.stack_signal, _stack_signal)
+        self.assertEqual(list(o_reso.stack_signal.keys()), ['CoAg', 'Gd'])
+
+    def test_stack_signal_can_be_pickled(self):
+        """assert a Resonance and its stack_signal can be pickled once the stack_signal has been accessed"""
+        o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso.add_layer(formula='CoAg', thickness=0.025)
+        _transmission = o_reso.stack_signal['CoAg']['Ag']['107-Ag']['transmission']
+        _attenuation = o_reso.stack_signal['CoAg']['attenuation']
+        o_reso_copy = pickle.loads(pickle.dumps(o_reso))
+        self.assertTrue(np.array_equal(o_reso_copy.stack_signal['CoAg']['Ag']['107-Ag']['transmission'],
+                                       _transmission))
+        _stack_signal = pickle.loads(pickle.dumps(o_reso.stack_signal))
+        self.assertTrue(np.array_equal(_stack_signal['CoAg']['attenuation'], _attenuation))
+        self.assertTrue(np.array_equal(_stack_signal['CoAg']['Co']['transmission'],
+                                       o_reso.stack_signal['CoAg']['Co']['transmission']))
+
+    def test_optical_depth_is_sum_of_elements(self):
+        """assert optical depth of compounds and stack is the sum of the optical depth of their elements"""
+        o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso.add_layer(formula='CoAg', thickness=0.025)
+        o_reso.add_layer(formula='Gd', thickness=0.01)
+        _total_optical_depth = 0.
+        for _compound in o_reso.stack.keys():
+            _optical_depth = 0.
+            for _element in o_reso.stack[_compound]['elements']:
+                _optical_depth = _optical_depth + o_reso.stack_signal[_compound][_element]['optical_depth']
+            self.assertTrue(np.allclose(o_reso.stack_signal[_compound]['optical_depth'], _optical_depth,
+                                        rtol=1e-12, atol=0))
+            _total_optical_depth = _total_optical_depth + _optical_depth
+        self.assertTrue(np.allclose(o_reso.total_signal['optical_depth'], _total_optical_depth, rtol=1e-12, atol=0))
+        self.assertTrue(np.array_equal(o_reso.total_signal['transmission'],
+                                       np.exp(-o_reso.total_signal['optical_depth'])))
+
+    def test_optical_depth_of_thick_sample(self):
+        """assert optical depth of a thick sample stays finite where its transmission underflows to 0"""
+        o_reso = Resonance(energy_min=0.01, energy_max=1, energy_step=0.01)
+        o_reso.add_layer(formula='Gd', thickness=100)
+        _optical_depth = o_reso.total_signal['optical_depth']
+        self.assertTrue(np.all(np.isfinite(_optical_depth)))
+        _opaque = _optical_depth > 745
+        self.assertTrue(np.any(_opaque))
+        self.assertTrue(np.all(o_reso.total_signal['transmission'][_opaque] == 0))
+        self.assertTrue(np.all(o_reso.total_signal['attenuation'][_opaque] == 1))
+        self.assertTrue(np.array_equal(o_reso.stack_signal['Gd']['optical_depth'], _optical_depth))
+
+
+class TestTransmissionVsThickness(unittest.TestCase):
+    def setUp(self):
+        self.o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        self.o_reso.add_layer(formula='CoAg', thickness=0.025)
+        self.o_reso.add_layer(formula='Gd', thickness=0.01)
+
+    def test_wrong_compound_or_thicknesses_raise_error(self):
+        """assert ValueError is raised if compound does not exist or thicknesses are not valid"""
+        self.assertRaises(ValueError, self.o_reso.transmission_vs_thickness, compound='Fe', thicknesses=[0.1])
+        self.assertRaises(ValueError, self.o_reso.transmission_vs_thickness, compound='Gd', thicknesses=[[0.1]])
+        self.assertRaises(ValueError, self.o_reso.transmission_vs_thickness, compound='Gd', thicknesses=[-0.1])
+
+    def test_transmission_vs_thickness(self):
+        """assert transmission_vs_thickness matches the transmission of the layer with each thickness"""
+        _thicknesses = [0, 0.025, 0.05]
+        _transmission = self.o_reso.transmission_vs_thickness(compound='CoAg', thicknesses=_thicknesses)
+        self.assertEqual(_transmission.shape, (3, len(self.o_reso.energy_eV)))
+        self.assertTrue(np.array_equal(_transmission[0], np.ones(len(self.o_reso.energy_eV))))
+        self.assertTrue(np.allclose(_transmission[1], self.o_reso.stack_signal['CoAg']['transmission'],
+                                    rtol=1e-12, atol=0))
+        o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso.add_layer(formula='CoAg', thickness=0.05)
+        self.assertTrue(np.allclose(_transmission[2], o_reso.total_signal['transmission'], rtol=1e-12, atol=0))
+
+    def test_transmission_vs_thickness_of_stack(self):
+        """assert transmission_vs_thickness with total=True includes the other layers of the stack"""
+        _transmission = self.o_reso.transmission_vs_thickness(compound='Gd', thicknesses=[0, 0.01], total=True)
+        self.assertTrue(np.allclose(_transmission[0], self.o_reso.stack_signal['CoAg']['transmission'],
+                                    rtol=1e-12, atol=0))
+        self.assertTrue(np.allclose(_transmission[1], self.o_reso.total_signal['transmission'], rtol=1e-12, atol=0))
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        self.o_reso.add_layer(formula='CoAg', thickness=0.025)
+        self.o_reso.add_layer(formula='Gd', thickness=0.01)
+
+    def test_wrong_parameters_raise_error(self):
+        """assert ValueError is raised if the compound, element, parameters or number of variants are not valid"""
+        self.assertRaises(ValueError, self.o_reso.sweep, parameters={})
+        self.assertRaises(ValueError, self.o_reso.sweep, parameters={'Fe': {'density': [7.8]}})
+        self.assertRaises(ValueError, self.o_reso.sweep, parameters={'Gd': {'mass': [7.8]}})
+        self.assertRaises(ValueError, self.o_reso.sweep, parameters={'CoAg': {'stoichiometric_ratio': [[1, 1, 1]]}})
+        self.assertRaises(ValueError, self.o_reso.sweep, parameters={'CoAg': {'isotopic_ratio': {'Gd': [[1]]}}})
+        self.assertRaises(ValueError, self.o_reso.sweep, parameters={'CoAg': {'density': [8, 9],
+                                                                              'thickness': [0.01]}})
+
+    def test_sweep_of_unchanged_stack(self):
+        """assert a sweep with the parameters of the stack matches the transmission of the stack"""
+        _density = self.o_reso.stack['CoAg']['density']['value']
+        _transmission = self.o_reso.sweep(parameters={'CoAg': {'density': [_density, _density]}}, total=True)
+        self.assertEqual(_transmission.shape, (2, len(self.o_reso.energy_eV)))
+        self.assertTrue(np.allclose(_transmission[1], self.o_reso.total_signal['transmission'], rtol=1e-12, atol=0))
+        _transmission = self.o_reso.sweep(parameters={'CoAg': {'density': [_density]}})
+        self.assertTrue(np.allclose(_transmission[0], self.o_reso.stack_signal['CoAg']['transmission'],
+                                    rtol=1e-12, atol=0))
+
+    def test_sweep_of_thickness(self):
+        """assert a sweep of thickness matches transmission_vs_thickness"""
+        _thicknesses = [0.01, 0.025, 0.1]
+        _transmission = self.o_reso.sweep(parameters={'Gd': {'thickness': _thicknesses}})
+        _expected = self.o_reso.transmission_vs_thickness(compound='Gd', thicknesses=_thicknesses)
+        self.assertTrue(np.allclose(_transmission, _expected, rtol=1e-12, atol=0))
+
+    def test_sweep_of_stoichiometric_ratio(self):
+        """assert a sweep of stoichiometric ratio matches the layer of the new formula"""
+        _transmission = self.o_reso.sweep(parameters={'CoAg': {'stoichiometric_ratio': [[1, 1], [1, 2]]}})
+        o_reso = Resonance(energy_min=1, energy_max=100, energy_step=0.1)
+        o_reso.add_layer(formula='CoAg2', thickness=0.025)
+        self.assertTrue(np.allclose(_transmission[1], o_reso.total_signal['transmission'], rtol=1e-12, atol=0))
+
+    def test_sweep_of_isotopic_ratio(self):
+        """assert a sweep of isotopic ratio matches set_isotopic_ratio"""
+        _n_isotopes = len(self.o_reso.stack['CoAg']['Ag']['isotopes']['list'])
+        _list_ratio = np.zeros(_n_isotopes)
+        _list_ratio[0] = 0.2
+        _list_ratio[1] = 0.8
+        _transmission = self.o_reso.sweep(parameters={'CoAg': {'isotopic_ratio': {'Ag': [_list_ratio]}}},
+                                          total=True)
+        self.o_reso.set_isotopic_ratio(compound='CoAg', element='Ag', list_ratio=list(_list_ratio))
+        self.assertTrue(np.allclose(_transmission[0], self.o_reso.total_signal['transmission'], rtol=1e-12, atol=0))
+
+    def test_sweep_with_processes(self):
+        """assert a sweep calculated by processes matches the sweep calculated in this process"""
+        _parameters = {'CoAg': {'thickness': np.linspace(0.01, 0.1, 5),
+                                'stoichiometric_ratio': [[1, 1], [1, 2], [2, 1], [1, 3], [3, 1]]},
+                       'Gd': {'density': np.linspace(7, 8, 5)}}
+        _transmission = self.o_reso.sweep(parameters=_parameters, chunk_size=2)
+        _transmission_processes = self.o_reso.sweep(parameters=_parameters, processes=2, chunk_size=2)
+        self.assertTrue(np.array_equal(_transmission, _transmission_processes))
+        self.assertRaises(ValueError, self.o_reso.sweep, parameters=_parameters, processes=0)
+        self.assertRaises(ValueError, self.o_reso.sweep, parameters=_parameters, chunk_size=0)
+
+
+class TestBatchTransmission(unittest.TestCase):
+    def setUp(self):
+        self.stacks = [{'CoAg': {'elements': ['Co', 'Ag'],
+                                 'stoichiometric_ratio': [1, 2],
+                                 'thickness': {'value': 0.025,
+                                               'units': 'mm'},
+                                 },
+                        'Ag': {'elements': ['Ag'],
+                               'stoichiometric_ratio': [1],
+                               'thickness': {'value': 0.03,
+                                             'units': 'mm'},
+                               },
+                        },
+                       {'Gd': {'elements': ['Gd'],
+                               'stoichiometric_ratio': [1],
+                               'thickness': {'value': 0.01,
+                                             'units': 'mm'},
+                               'density': {'value': 7.5,
+                                           'units': 'g/cm3'},
+                               },
+                        },
+                       ]
+
+    def test_empty_stacks_raise_error(self):
+        """assert ValueError is raised if no stack is provided"""
+        self.assertRaises(ValueError, Resonance.batch_transmission, stacks=[])
+
+    def test_batch_transmission(self):
+        """assert batch_transmission matches the transmission of each sample"""
+        _batch = Resonance.batch_transmission(stacks=self.stacks, energy_min=1, energy_max=100, energy_step=0.1)
+        self.assertEqual(_batch['transmission'].shape, (2, len(_batch['energy_eV'])))
+        for _stack, _transmission in zip(self.stacks, _batch['transmission']):
+            o_reso = Resonance(stack=_stack, energy_min=1, energy_max=100, energy_step=0.1)
+            self.assertTrue(np.array_equal(_batch['energy_eV'], o_reso.energy_eV))
+            self.assertTrue(np.allclose(_transmission, o_reso.total_signal['transmission'], rtol=1e-12, atol=0))
+
+    def test_batch_transmission_with_native_grid(self):
+        """assert the 'native' energy axis of batch_transmission is built from the isotopes of all the samples"""
+        _batch = Resonance.batch_transmission(stacks=self.stacks, energy_min=1, energy_max=10, grid='native')
+        o_reso = Resonance(energy_min=1, energy_max=10, grid='native')
+        o_reso.add_layer(formula='Ag', thickness=0.01)
+        o_reso.add_layer(formula='CoGd', thickness=0.01)
+        self.assertTrue(np.array_equal(_batch['energy_eV'], o_reso.energy_eV))
+
+    def test_each_isotope_is_loaded_once(self):
+        """assert the sigma of every distinct isotope of the samples is interpolated once"""
+        _utilities.cache_clear(cache='sigma')
+        Resonance.batch_transmission(stacks=self.stacks, energy_min=1, energy_max=100, energy_step=0.1)
+        _n_files = 0
+        for _element in ['Co', 'Ag', 'Gd']:
+            _isotopes = _utilities.get_isotope_dicts(element=_element, database='ENDF_VIII')['isotopes']
+            _n_files += len(_isotopes['file_names'])
+        self.assertEqual(_utilities.cache_info(cache='sigma')['entries'], _n_files)
+        self.assertEqual(_utilities.cache_info(cache='sigma')['misses'], _n_files)
+
+
+class TestStreamTransmission(unittest.TestCase):
+    def setUp(self):
+        self.stack = {'CoAg': {'elements': ['Co', 'Ag'],
+                               'stoichiometric_ratio': [1, 2],
+                               'thickness': {'value': 0.025,
+                                             'units': 'mm'},
+                               },
+                      'Gd': {'elements': ['Gd'],
+                             'stoichiometric_ratio': [1],
+                             'thickness': {'value': 0.01,
+                                           'units': 'mm'},
+                             },
+                      }
+
+    def test_wrong_arguments_raise_error(self):
+        """assert ValueError is raised if the stack is empty or the chunk size is not > 0"""
+        self.assertRaises(ValueError, next, Resonance.stream_transmission(stack={}))
+        self.assertRaises(ValueError, next, Resonance.stream_transmission(stack=self.stack, chunk_size=0))
+
+    def test_stream_transmission(self):
+        """assert the chunks put end to end match the energy axis and transmission of the stack"""
+        for _kwargs in [{'energy_min': 1, 'energy_max': 100, 'energy_step': 0.1},
+                        {'energy_min': 1, 'energy_max': 100, 'grid': 'log', 'points_per_decade': 500},
+                        {'energy_min': 1, 'energy_max': 10, 'grid': 'native'}]:
+            o_reso = Resonance(stack=self.stack, **_kwargs)
+            _chunks = list(Resonance.stream_transmission(stack=self.stack, chunk_size=64, **_kwargs))
+            self.assertTrue(all([len(_energy) <= 64 for _energy, _transmission in _chunks]))
+            _energy = np.concatenate([_energy for _energy, _transmission in _chunks])
+            _transmission = np.concatenate([_transmission for _energy, _transmission in _chunks])
+            self.assertTrue(np.array_equal(_energy, o_reso.energy_eV))
+            self.assertTrue(np.allclose(_transmission, o_reso.total_signal['transmission'], rtol=1e-12, atol=0))
+
+    def test_chunk_edge_on_repeated_energy(self):
+        """assert a chunk ending on a repeated energy of the native grid matches the stack"""
+        _stack = {'Au': {'elements': ['Au'],
+                         'stoichiometric_ratio': [1],
+                         'thickness': {'value': 0.025,
+                                       'units': 'mm'},
+                         },
+                  }
+        _kwargs = {'energy_min': 100, 'energy_max': 130, 'grid': 'native'}
+        o_reso = Resonance(stack=_stack, **_kwargs)
+        _chunks = list(Resonance.stream_transmission(stack=_stack, chunk_size=7, **_kwargs))
+        _edges = [_energy[-1] for _energy, _transmission in _chunks]
+        _table_energy = get_backend('ENDF_VIII').get_data(file_name='Au-197.csv')['E_eV']
+        self.assertTrue(any([np.count_nonzero(_table_energy == _edge) > 1 for _edge in _edges]))
+        _transmission = np.concatenate([_transmission for _energy, _transmission in _chunks])
+        self.assertTrue(np.allclose(_transmission, o_reso.total_signal['transmission'], rtol=1e-12, atol=0))
@@ -3,6 +3,8 @@ import numpy as np
 import os
 import pprint
 import pandas as pd
+import shutil
+import tempfile
 
 from ImagingReso.resonance import Resonance
 from ImagingReso._utilities import *
@@ -328,6 +330,91 @@ class TestUtilities_2(unittest.TestCase):
         self.assertEqual(energy_last_expected, energy_last_returned)
         self.assertAlmostEquals(sigma_last_expected, sigma_last_returned, delta=0.0001)
 
+    def test_get_sigmas(self):
+        """assert get_sigmas interpolates all the isotopes over the same energy axis"""
+        file_names = [os.path.join(self.database_path, 'Ag-107.csv'),
+                      os.path.join(self.database_path, 'Ag-109.csv')]
+        _dict_returned = get_sigmas(database_file_names=file_names, E_min=300, E_max=600, E_step=10)
+        self.assertEqual(_dict_returned['sigma_b'].shape, (2, 31))
+        for _row, _file_name in enumerate(file_names):
+            _dict_expected = get_sigma(database_file_name=_file_name, E_min=300, E_max=600, E_step=10)
+            self.assertIs(_dict_expected['energy_eV'], _dict_returned['energy_eV'])
+            self.assertTrue(np.array_equal(_dict_expected['sigma_b'], _dict_returned['sigma_b'][_row]))
+
+    def test_get_energy_grid_chunks(self):
+        """assert the chunks of the energy axis put end to end are the energy axis"""
+        for _kwargs in [{'E_min': 1, 'E_max': 300, 'E_step': 0.01},
+                        {'E_min': 1e-5, 'E_max': 3e3, 'grid': 'log', 'points_per_decade': 1000}]:
+            _energy = get_energy_grid(**_kwargs)
+            for _chunk_size in [7, 1000, len(_energy)]:
+                _chunks = list(get_energy_grid_chunks(chunk_size=_chunk_size, **_kwargs))
+                self.assertTrue(all([len(_chunk) <= _chunk_size for _chunk in _chunks]))
+                self.assertTrue(np.array_equal(np.concatenate(_chunks), _energy))
+        self.assertRaises(ValueError, next, get_energy_grid_chunks(E_min=1, E_max=10, E_step=1, chunk_size=0))
+
+    def test_sigma_cache_holds_the_memory_it_counts(self):
+        """assert the sigma cached for each isotope does not keep the (isotopes x energies) array alive"""
+        file_names = [os.path.join(self.database_path, _file) for _file in ['Ag-107.csv', 'Ag-109.csv',
+                                                                            'Co-59.csv', 'Gd-155.csv', 'O-16.csv']]
+        cache_clear(cache='sigma')
+        _sigmas = get_sigmas(database_file_names=file_names, E_min=300, E_max=600, E_step=10)['sigma_b']
+        _nbytes = 0
+        for _row, _file_name in enumerate(file_names):
+            _sigma = get_sigma(database_file_name=_file_name, E_min=300, E_max=600, E_step=10)['sigma_b']
+            self.assertIsNone(_sigma.base)
+            self.assertFalse(np.shares_memory(_sigma, _sigmas))
+            self.assertTrue(np.array_equal(_sigma, _sigmas[_row]))
+            _nbytes += _sigma.nbytes
+        self.assertEqual(cache_info(cache='sigma')['nbytes'], _nbytes)
+
+    def test_get_sigmas_with_threads(self):
+        """assert get_sigmas loads the isotopes with threads as they are loaded one after the other"""
+        file_names = [os.path.join(self.database_path, _file) for _file in ['Ag-107.csv', 'Ag-109.csv',
+                                                                            'Co-59.csv', 'Gd-155.csv']]
+        cache_clear(cache='sigma')
+        _dict_expected = get_sigmas(database_file_names=file_names, E_min=300, E_max=600, E_step=10,
+                                    max_workers=1)
+        cache_clear(cache='sigma')
+        _dict_returned = get_sigmas(database_file_names=file_names, E_min=300, E_max=600, E_step=10,
+                                    max_workers=4)
+        self.assertTrue(np.array_equal(_dict_expected['sigma_b'], _dict_returned['sigma_b']))
+        self.assertEqual(cache_info(cache='sigma')['entries'], 4)
+
+    def test_interpolate_tables_raises_error_if_outside_range(self):
+        """assert ValueError if the energy axis is outside the range of the table"""
+        _table = {'E_eV': np.array([1., 2., 3.]),
+                  'Sig_b': np.array([1., 2., 3.])}
+        self.assertRaises(ValueError, interpolate_tables, tables=[_table], energy=np.array([0.5, 1.]))
+        self.assertRaises(ValueError, interpolate_tables, tables=[_table], energy=np.array([1., 4.]))
+        _sigmas = interpolate_tables(tables=[_table, _table], energy=np.array([1., 1.5, 3.]))
+        self.assertTrue(np.array_equal(_sigmas, [[1., 1.5, 3.], [1., 1.5, 3.]]))
+
+    def test_get_adaptive_energy_axis(self):
+        """assert adaptive energy axis keeps only the points needed to describe the peaks"""
+        _smooth = {'E_eV': np.linspace(1, 10, 10),
+                   'Sig_b': np.linspace(20, 2, 10)}
+        _peak = {'E_eV': np.array([1., 2., 3., 4., 5., 6., 10.]),
+                 'Sig_b': np.array([1., 1., 1., 50., 1., 1., 1.])}
+        _energy = get_adaptive_energy_axis(tables=[_smooth], E_min=1.5, E_max=9.5)
+        self.assertTrue(np.array_equal(_energy, [1.5, 9.5]))
+        _energy = get_adaptive_energy_axis(tables=[_smooth, _peak], E_min=1.5, E_max=9.5)
+        self.assertTrue(np.array_equal(_energy, [1.5, 3., 4., 5., 9.5]))
+        self.assertRaises(ValueError, get_adaptive_energy_axis, tables=[_peak], E_min=0.5, E_max=9.5)
+
+    def test_get_adaptive_energy_axis_of_several_tables(self):
+        """assert every table is within tolerance on the axis of all the tables"""
+        # within tolerance of the chord [1, 4], but not of the chord [1, 3] once the peak of _peak is added
+        _s_shape = {'E_eV': np.array([1., 2., 3., 4.]),
+                    'Sig_b': np.array([100., 100.09, 99.91, 100.])}
+        _peak = {'E_eV': np.array([1., 3., 4.]),
+                 'Sig_b': np.array([1., 10., 1.])}
+        self.assertTrue(np.array_equal(get_adaptive_energy_axis(tables=[_s_shape], E_min=1, E_max=4), [1., 4.]))
+        _energy = get_adaptive_energy_axis(tables=[_s_shape, _peak], E_min=1, E_max=4)
+        self.assertTrue(np.array_equal(_energy, [1., 2., 3., 4.]))
+        for _table in [_s_shape, _peak]:
+            _sigma = np.interp(_table['E_eV'], _energy, np.interp(_energy, _table['E_eV'], _table['Sig_b']))
+            self.assertTrue(np.all(np.abs(_sigma - _table['Sig_b']) <= 1e-3 * np.abs(_table['Sig_b'])))
+
     def test_get_atoms_per_cm3_of_layer(self):
         """assert get_atoms_per_cm3_of_layer works"""
         _stack = {'CoAg': {'elements': ['Co', 'Ag'],
@@ -359,6 +446,47 @@ class TestUtilities_2(unittest.TestCase):
         transmission_expected = np.array([np.exp(-thickness * 1e-24 * _b * atoms_per_cm3) for _b in sigma_b])
         self.assertTrue((transmission_expected == transmission_returned).all())
 
+    def test_calculate_optical_depth(self):
+        """assert calculate_optical_depth sums the optical depth of the isotopes"""
+        thickness = 0.01  # cm
+        atoms_per_cm3 = np.array([8.9e22, 1.2e22])
+        sigma_b = np.array([np.linspace(1, 10, 10), np.linspace(100, 10, 10)])
+        optical_depth = calculate_optical_depth(areal_density=thickness * 1e-24 * atoms_per_cm3, sigma_b=sigma_b)
+        transmission_expected = calculate_transmission(thickness_cm=thickness, atoms_per_cm3=atoms_per_cm3[0],
+                                                       sigma_b=sigma_b[0]) * \
+                                calculate_transmission(thickness_cm=thickness, atoms_per_cm3=atoms_per_cm3[1],
+                                                       sigma_b=sigma_b[1])
+        self.assertEqual(optical_depth.shape, (10,))
+        self.assertTrue(np.allclose(np.exp(-optical_depth), transmission_expected, rtol=1e-12, atol=0))
+
+    def test_calculate_sweep_transmission(self):
+        """assert the transmission of the variants is the same with and without processes"""
+        _areal_density = np.random.rand(7, 3) * 1e-3
+        _sigma_b = np.random.rand(3, 50) * 1e3
+        _optical_depth = np.random.rand(50)
+        _transmission = calculate_sweep_transmission(areal_density=_areal_density, sigma_b=_sigma_b,
+                                                     optical_depth=_optical_depth, chunk_size=3)
+        self.assertTrue(np.allclose(_transmission, np.exp(-(np.dot(_areal_density, _sigma_b) + _optical_depth)),
+                                    rtol=1e-12, atol=0))
+        _transmission_processes = calculate_sweep_transmission(areal_density=_areal_density, sigma_b=_sigma_b,
+                                                               optical_depth=_optical_depth, processes=2,
+                                                               chunk_size=3)
+        self.assertTrue(np.array_equal(_transmission, _transmission_processes))
+
+    def test_lazy_dict(self):
+        """assert LazyDict calculates each value once, the first time it is accessed"""
+        _calls = []
+        _dict = LazyDict(factories={'a': lambda: _calls.append('a') or 1,
+                                    'b': lambda: _calls.append('b') or 2})
+        self.assertEqual(list(_dict), ['a', 'b'])
+        self.assertEqual(_calls, [])
+        self.assertEqual(_dict['b'], 2)
+        self.assertEqual(_dict['b'], 2)
+        self.assertEqual(_calls, ['b'])
+        self.assertFalse(_dict.is_calculated('a'))
+        self.assertEqual(dict(_dict), {'a': 1, 'b': 2})
+        self.assertRaises(KeyError, _dict.__getitem__, 'c')
+
     def test_set_distance_units(self):
         """asset set_distance_units works"""
         # cm -> mm
@@ -394,6 +522,87 @@ class TestUtilities_2(unittest.TestCase):
         self.assertAlmostEquals(expected_energy_lambda_3, energy_lambda[3], delta=0.0001)
 
 
+class TestUtilities_cache(unittest.TestCase):
+    def setUp(self):
+        _file_path = os.path.dirname(__file__)
+        _database_path = os.path.abspath(os.path.join(_file_path, '../../ImagingReso/reference_data/ENDF_VII'))
+        self.tmp_folder = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.tmp_folder, 'Ag-107.csv')
+        shutil.copy(os.path.join(_database_path, 'Ag-107.csv'), self.file_name)
+        self.max_bytes = cache_info()['max_bytes']
+        cache_clear()
+
+    def tearDown(self):
+        set_cache_max_bytes(max_bytes=self.max_bytes)
+        cache_clear()
+        shutil.rmtree(self.tmp_folder)
+
+    def test_cache_info_raises_error_if_wrong_cache(self):
+        """assert ValueError if cache does not exist"""
+        self.assertRaises(ValueError, cache_info, cache='do_not_exist')
+
+    def test_database_data_is_cached(self):
+        """assert get_database_data reads the csv file only once"""
+        _df_1 = get_database_data(file_name=self.file_name)
+        _df_2 = get_database_data(file_name=self.file_name)
+        _info = cache_info()
+        self.assertEqual(_info['misses'], 1)
+        self.assertEqual(_info['hits'], 1)
+        self.assertEqual(_info['entries'], 1)
+        self.assertEqual(_info['nbytes'], 2 * 8 * len(_df_1))
+        self.assertTrue((_df_1.values == _df_2.values).all())
+
+        # returned dataframe can be modified without corrupting the cache
+        _df_1['Sig_b'] = 0
+        _df_3 = get_database_data(file_name=self.file_name)
+        self.assertTrue((_df_2.values == _df_3.values).all())
+
+        cache_clear()
+        self.assertEqual(cache_info()['entries'], 0)
+
+    def test_cache_respects_max_bytes(self):
+        """assert entries are evicted when the budget is too small"""
+        set_cache_max_bytes(max_bytes=0)
+        get_database_data(file_name=self.file_name)
+        get_database_data(file_name=self.file_name)
+        _info = cache_info()
+        self.assertEqual(_info['entries'], 0)
+        self.assertEqual(_info['misses'], 2)
+
+    def test_sigma_is_cached(self):
+        """assert get_sigma interpolates only once per isotope and energy range"""
+        _sigma_1 = get_sigma(database_file_name=self.file_name, E_min=1, E_max=10, E_step=0.1)
+        _sigma_2 = get_sigma(database_file_name=self.file_name, E_min=1, E_max=10, E_step=0.1)
+        self.assertIs(_sigma_1['sigma_b'], _sigma_2['sigma_b'])
+        self.assertFalse(_sigma_1['sigma_b'].flags.writeable)
+        _info = cache_info(cache='sigma')
+        self.assertEqual(_info['misses'], 1)
+        self.assertEqual(_info['hits'], 1)
+
+        # different range -> new entry
+        _sigma_3 = get_sigma(database_file_name=self.file_name, E_min=1, E_max=10, E_step=1)
+        self.assertEqual(len(_sigma_3['sigma_b']), 10)
+        self.assertEqual(cache_info(cache='sigma')['entries'], 2)
+
+    def test_energy_grid_is_cached(self):
+        """assert get_energy_grid shares one read-only array per range, within the budget of the 'energy' cache"""
+        _energy_1 = get_energy_grid(E_min=1, E_max=10, E_step=0.1)
+        _energy_2 = get_energy_grid(E_min=1, E_max=10, E_step=0.1)
+        self.assertIs(_energy_1, _energy_2)
+        self.assertFalse(_energy_1.flags.writeable)
+        _energy_3 = get_energy_grid(E_min=1, E_max=10, grid='log', points_per_decade=100, dtype=np.float32)
+        self.assertFalse(_energy_3.flags.writeable)
+        _info = cache_info(cache='energy')
+        self.assertEqual(_info['misses'], 2)
+        self.assertEqual(_info['hits'], 1)
+        self.assertEqual(_info['entries'], 2)
+        self.assertEqual(_info['nbytes'], _energy_1.nbytes + _energy_3.nbytes)
+
+        cache_clear()
+        self.assertEqual(cache_info(cache='energy')['nbytes'], 0)
+        self.assertIsNot(get_energy_grid(E_min=1, E_max=10, E_step=0.1), _energy_1)
+
+
 class TestUtilities_xaxis_convertor(unittest.TestCase):
     def test_complains_if_wrong_units(self):
         """assert ValueError raised if wrong units given"""